@@ -0,0 +1,213 @@
+""" Benchmark suite of the scanning and organizing engine, over a synthetic library built on tmpfs.
+
+    Builds a deterministic library with benchmarks/synthetic_library.py, and times each stage of the engine on it:
+        parse:       get_show_season_and_episode of each path, without the parse cache
+        media_file:  MediaFile construction from the names parsed by classify_names
+        group:       MediaContainers grouping of the media files
+        plan:        listing the media folder, and a dry-run plan_organize of every file
+        walk:        iter_media_files of the downloads, which is the file system part of a scan
+        scan_cold:   scan_media of the downloads, without a scan index or parse cache
+        scan_warm:   scan_media of the downloads again, with the scan index of the cold scan
+    Each stage reports its best time of the repeats in files/s, and the peak RSS of the process after it;
+    The stages run in that order in one process, so the peak RSS of a stage includes the stages before it.
+
+    Usage:
+        python benchmarks/engine.py [--count N] [--seed N] [--repeat N] [--folder PATH] [--history FILE]
+
+    With --history, the results are appended to the file as a line of JSON, and compared to the last run in it.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.synthetic_library import EXTENSIONS, tmpfs_folder, build_library
+from src.components.data import MediaFile, MediaContainers
+from src.funcs.general import get_show_season_and_episode, classify_names
+from src.funcs.memo import PARSE_CACHE
+from src.funcs.scanner import ScanIndex, iter_media_files, scan_media
+from src.funcs.library import LibraryIndex
+from src.funcs.organizer import plan_organize
+
+
+def peak_rss():
+    """ The peak resident set size of this process in bytes, or None where it is not known """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports it in KiB, and macOS in bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def best_time(func, repeat, setup=None):
+    """ The shortest time of the function in seconds, and its result from that run
+
+    Args:
+        func (Callable): Called with the result of setup, or without arguments
+        repeat (int): The number of times to run it
+        setup (Callable): Called before each run, outside of the time
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        output = func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best, result = elapsed, output
+    return best, result
+
+
+def run_stages(downloads_path, media_path, paths, repeat):
+    """ Times each stage of the engine
+
+    Returns: {stage: {seconds, files_per_second, peak_rss}}
+    """
+    results = dict()
+
+    def record(stage, seconds, files):
+        results[stage] = {
+            'seconds': round(seconds, 4),
+            'files_per_second': round(files / seconds) if seconds else None,
+            'peak_rss': peak_rss(),
+        }
+
+    PARSE_CACHE.clear()
+    # Bypass the PARSE_CACHE, so each repeat parses every path
+    seconds, _ = best_time(lambda: [get_show_season_and_episode.__wrapped__(path) for path in paths], repeat)
+    record('parse', seconds, len(paths))
+
+    rows = classify_names(paths).rows()
+    seconds, media_files = best_time(
+        lambda: [MediaFile(path, downloads_path, parsed=row) for path, row in zip(paths, rows)], repeat
+    )
+    record('media_file', seconds, len(paths))
+
+    def group():
+        media_containers = MediaContainers()
+        for media_file in media_files:
+            media_containers.add(media_file)
+        return media_containers
+
+    seconds, media_containers = best_time(group, repeat)
+    record('group', seconds, len(paths))
+
+    def plan():
+        library = LibraryIndex(media_path)
+        library.build({c.title for c in media_containers if c.type == 'TV Show'})
+        return plan_organize(media_containers, media_path, downloads_path, library)
+
+    seconds, organize_plan = best_time(plan, repeat)
+    record('plan', seconds, len(paths))
+    results['plan']['steps'] = len(organize_plan.steps)
+    results['plan']['conflicts'] = len(organize_plan.conflicts)
+    del media_files, media_containers, organize_plan
+
+    seconds, found = best_time(lambda: sum(1 for _ in iter_media_files([downloads_path], EXTENSIONS)), repeat)
+    record('walk', seconds, len(paths))
+    results['walk']['found'] = found
+
+    index_path = os.path.join(os.path.dirname(downloads_path), 'scan_index')
+
+    def cold_index():
+        PARSE_CACHE.clear()
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        return ScanIndex(index_path, EXTENSIONS)
+
+    def scan(index):
+        media_containers = MediaContainers()
+        scan_media([downloads_path], EXTENSIONS, media_containers, index)
+        return index, sum(len(c.media_files) for c in media_containers)
+
+    seconds, (index, found) = best_time(scan, repeat, cold_index)
+    record('scan_cold', seconds, len(paths))
+    results['scan_cold']['found'] = found
+    index.save()
+    del index
+
+    def warm_index():
+        PARSE_CACHE.clear()
+        return ScanIndex(index_path, EXTENSIONS)
+
+    seconds, (index, found) = best_time(scan, repeat, warm_index)
+    record('scan_warm', seconds, len(paths))
+    results['scan_warm']['found'] = found
+    return results
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def last_run(history):
+    """ The last run recorded in the history file, or None """
+    if not history or not os.path.exists(history):
+        return None
+    with open(history) as file:
+        lines = [line for line in file if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def report(run, previous=None):
+    print(f'{run["count"]:,} files, seed {run["seed"]}, best of {run["repeat"]}, {run["python"]}, {run["revision"]}')
+    for stage, result in run['stages'].items():
+        rate = result['files_per_second']
+        line = f'{stage:<11} {result["seconds"]:9.3f} s {rate or 0:>12,} files/s'
+        if result['peak_rss'] is not None:
+            line += f'  {result["peak_rss"] / 2 ** 20:8,.1f} MiB peak RSS'
+        before = previous and previous['stages'].get(stage)
+        if before and before['files_per_second'] and rate and previous['count'] == run['count']:
+            line += f'  {rate / before["files_per_second"] - 1:+7.1%} files/s vs {previous["revision"]}'
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the engine over a synthetic library on tmpfs.')
+    parser.add_argument('--count', type=int, default=100000, help='The number of media files in the library')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the library names')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of times each stage is run')
+    parser.add_argument('--folder', help='Where to build the library; A new folder on tmpfs by default, removed after')
+    parser.add_argument('--history', help='A file to append the results to, and to compare them with')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    folder = args.folder or tmpfs_folder()
+    try:
+        start = time.perf_counter()
+        downloads_path, media_path, paths = build_library(folder, args.count, args.seed)
+        print(f'Built the library in {folder} in {time.perf_counter() - start:.1f} s')
+        stages = run_stages(downloads_path, media_path, paths, args.repeat)
+    finally:
+        if not args.folder:
+            shutil.rmtree(folder, ignore_errors=True)
+    run = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'count': args.count,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'stages': stages,
+    }
+    report(run, last_run(args.history))
+    if args.history:
+        with open(args.history, 'a') as file:
+            file.write(json.dumps(run) + '\n')
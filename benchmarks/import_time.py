@@ -0,0 +1,85 @@
+""" Import time benchmark of the startup modules, measured by the interpreter's -X importtime.
+
+    Imports each module in a fresh interpreter, run from the src folder as the app is, and reports the median
+    cumulative import time of the module, its slowest imports, and whether it imported any of the modules
+    that should only be imported on first use.
+
+    Usage:
+        python benchmarks/import_time.py [repeat] [budget_ms]
+
+    Exits with 1 if a module imports a lazy module it should not, or if budget_ms is given and a headless module
+    takes longer than it to import.
+"""
+import os
+import sys
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / 'src'
+
+# (module, headless) of the modules to measure; Headless modules must not import the LAZY modules
+MODULES = [
+    ('src.components.data', True),
+    ('src.funcs.scanner', True),
+    ('src.funcs.organizer', True),
+    ('src.cli', True),
+    ('src.screens', False),
+]
+# The heavy modules that are only imported when they are first needed
+LAZY = ('tkinter', 'PIL', 'yaml', 'difflib', 'multiprocessing', 'concurrent.futures.process')
+
+
+def import_times(module):
+    """ The import times of a module and everything it imports, in a fresh interpreter
+
+    Returns: {module name: (self us, cumulative us)}
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC, env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f'Importing {module} failed:\n{result.stderr}')
+    times = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(module, repeat):
+    """ The median cumulative import time of a module in ms, its slowest imports, and the lazy modules it imported """
+    runs = [import_times(module) for _ in range(repeat)]
+    total = statistics.median(run[module][1] for run in runs) / 1000
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)[:5]
+    lazy = sorted({name for name in runs[-1] for prefix in LAZY if name == prefix or name.startswith(f'{prefix}.')})
+    return total, slowest, lazy
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    failed = False
+    for module, headless in MODULES:
+        try:
+            total, slowest, lazy = measure(module, repeat)
+        except RuntimeError as e:
+            # The GUI modules need tkinter and PIL, which may not be installed where this runs
+            print(f'{module}: {e}')
+            failed = failed or headless
+            continue
+        print(f'{module}: {total:,.1f} ms')
+        for name, (self_us, cumulative_us) in slowest:
+            print(f'    {self_us / 1000:7.1f} ms  {name}')
+        if headless and lazy:
+            print(f'    Imported lazy modules: {", ".join(lazy)}')
+            failed = True
+        if headless and budget is not None and total > budget:
+            print(f'    Over the budget of {budget:,.1f} ms')
+            failed = True
+    sys.exit(1 if failed else 0)
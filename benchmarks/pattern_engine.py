@@ -0,0 +1,121 @@
+""" Parity check and micro-benchmark for the compiled pattern engine in get_show_season_and_episode.
+
+    Compares the compiled engine against the original implementation, which tried each pattern and wrapper
+    in turn with an uncompiled re.findall, and reports the files per second of each.
+
+    Usage:
+        python benchmarks/pattern_engine.py [repeat]
+"""
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.funcs.general import (
+    SEASON_EPISODE_PATTERNS, EPISODE_PATTERNS, generate_show_patterns, get_show_season_and_episode
+)
+
+EXAMPLES = Path(__file__).resolve().parents[1] / 'src' / 'resources' / 'examples'
+
+
+def reference_show_season_and_episode(file_path):
+    """ The original get_show_season_and_episode, kept as the reference for the parity check """
+
+    def get_show_from_patterns(patterns):
+        for media_pattern in patterns:
+            for pattern in generate_show_patterns(media_pattern):
+                found = re.findall(pattern, file_name, re.IGNORECASE)
+                if found:
+                    return found[0]
+        return ''
+
+    file_name = os.path.basename(file_path)
+    show = get_show_from_patterns(SEASON_EPISODE_PATTERNS)
+    season = ''
+    episode = ''
+    for f in os.path.split(os.path.dirname(file_path)):
+        s = re.findall(r'season (\d+)', f, re.IGNORECASE)
+        if s:
+            season = s[0] if isinstance(s, list) else s
+            if len(season) == 1:
+                season = f'0{season}'
+    if show:
+        nums = [n if len(n) > 1 else f'0{n}' for n in re.findall(r'\d+', show)]
+        if len(nums) == 3:
+            return show, nums[0], f'{nums[1]}-{nums[2]}'
+        if len(nums) == 2:
+            return show, nums[0], nums[1]
+        if len(nums) == 1:
+            nums = [n for n in nums[0]]
+            if len(nums) == 4:
+                return show, ''.join(nums[0:2]), ''.join(nums[2:4])
+            if len(nums) == 3:
+                return show, nums[0], ''.join(nums[1:3])
+    if not show and season:
+        show = get_show_from_patterns(EPISODE_PATTERNS)
+    if show:
+        nums = [n if len(n) > 1 else f'0{n}' for n in re.findall(r'\d+', show)]
+        if len(nums) == 2:
+            return show, season, f'{nums[1]}-{nums[2]}'
+        if len(nums) == 1:
+            return show, season, nums[0]
+    return show, season, episode
+
+
+def sample_paths():
+    """ The example media, and a spread of generated names covering each pattern """
+    paths = [str(p.relative_to(EXAMPLES)) for p in EXAMPLES.rglob('*') if p.is_file()]
+    for i in range(1, 400):
+        season, episode = i % 12 + 1, i % 24 + 1
+        paths += [
+            f'the.office.us.s{season:02}e{episode:02}.720p.HDTV.x264-GRP.mkv',
+            f'Show {i} - s{season}e{episode}e{episode + 1}.avi',
+            f'show.{i}.S{season:02} E{episode:02}.mp4',
+            f'Show Name {season}x{episode:02} Title.mkv',
+            f'Show Name Season {season} Episode {episode}.mkv',
+            f'show.name.{season}{episode:02}.hdtv.mp4',
+            f'Show Name/Season {season}/show.name.episode.{episode}.mkv',
+            f'Show Name/Season {season}/Show Name - x{episode:02}.mkv',
+            f'Show Name/Season {season}/{episode:02} - Title.mkv',
+            f'Movie Title {i} (20{i % 24:02}) 1080p BluRay.mkv',
+            f'(Movie) {i} [2160p].mp4',
+        ]
+    return paths
+
+
+def safe(func, path):
+    """ The result of the parser, or the exception type; The original raises on 'Season N/e01e02' names """
+    try:
+        return func(path)
+    except Exception as e:
+        return type(e)
+
+
+def files_per_second(func, paths, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            safe(func, path)
+    return len(paths) * repeat / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    paths = sample_paths()
+    mismatches = [p for p in paths
+                  if safe(get_show_season_and_episode, p) != safe(reference_show_season_and_episode, p)]
+    for path in mismatches:
+        print(f'MISMATCH {path}: {safe(get_show_season_and_episode, path)}'
+              f' != {safe(reference_show_season_and_episode, path)}')
+    print(f'Parity: {len(paths) - len(mismatches)}/{len(paths)} paths')
+    reference = files_per_second(reference_show_season_and_episode, paths, repeat)
+    # Bypass the PARSE_CACHE, so only the pattern engine is measured
+    compiled = files_per_second(get_show_season_and_episode.__wrapped__, paths, repeat)
+    memoized = files_per_second(get_show_season_and_episode, paths, repeat)
+    print(f'Reference: {reference:,.0f} files/s')
+    print(f'Compiled:  {compiled:,.0f} files/s ({compiled / reference:.1f}x)')
+    print(f'Memoized:  {memoized:,.0f} files/s ({memoized / reference:.1f}x)')
+    sys.exit(1 if mismatches else 0)
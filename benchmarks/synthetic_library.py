@@ -0,0 +1,168 @@
+""" Deterministic generator of synthetic download folders and media libraries, for the engine benchmarks.
+
+    The same count and seed always give the same names, in the naming styles found in real downloads:
+        sxxeyy:  Show.Name.S02.1080p.WEB-DL/Show.Name.S02E05.1080p.WEB-DL.x264-GRP.mkv
+        1x01:    Show Name/Show Name 2x05 Episode Title.avi
+        101:     show.name.205.hdtv.mp4
+        season:  Show Name/Season 2/Episode 5.mkv
+        movie:   Movie Title (2011) 1080p BluRay x264/Movie Title (2011) 1080p BluRay x264.mkv
+    Season packs and movie folders come with the .nfo, .srt and .txt files download folders have,
+    and some of the shows and movies are already in the media folder, so organizing them has collisions to find.
+    The files are empty; The engine only ever looks at their names and stats.
+
+    Usage:
+        python benchmarks/synthetic_library.py [count] [seed] [folder]
+
+    Builds the library in a new folder on tmpfs, or in the given folder, and prints where it is.
+"""
+import os
+import sys
+import random
+import tempfile
+from collections import Counter
+
+# The extensions the generated media files have; All of them are in the app's default media extensions
+EXTENSIONS = {'mkv', 'mp4', 'avi'}
+WORDS = (
+    'the', 'last', 'dark', 'house', 'river', 'night', 'city', 'lost', 'blue', 'king', 'game', 'office',
+    'star', 'line', 'wild', 'north', 'winter', 'fire', 'empire', 'secret', 'doctor', 'young', 'black', 'mirror',
+    'bridge', 'silent', 'crown', 'broken', 'road', 'island', 'garden', 'shadow', 'west', 'world', 'ghost',
+    'family', 'good', 'place', 'better', 'call', 'true', 'detective', 'stranger', 'things', 'boys', 'mountain',
+    'paper', 'heist', 'ozark', 'fargo', 'legion', 'raven', 'harbor', 'valley', 'signal', 'orbit', 'atlas',
+)
+# The syllables of made up title words, so the titles have the variety of a real library's, not just the WORDS
+SYLLABLES = (
+    'ka', 'ri', 'mo', 'tan', 'vel', 'or', 'bre', 'zu', 'lin', 'dar', 'eth', 'qui', 'sol', 'ny', 'gar', 'pha',
+    'ste', 'wy', 'hol', 'cru', 'mi', 'ba', 'ton', 'ex', 'fen', 'jo', 'lu', 'sar', 'vi', 'dro', 'ak', 'nel',
+)
+# The share of the title words that are from WORDS
+COMMON_SHARE = 0.4
+RESOLUTIONS = ('480p', '720p', '1080p', '2160p')
+SOURCES = ('HDTV', 'WEB-DL', 'WEBRip', 'BluRay')
+GROUPS = ('GRP', 'NTb', 'DIMENSION', 'LOL', 'KILLERS', 'SPARKS')
+# The share of the shows in each naming style, and the share of the media files that are movies
+STYLES = (('sxxeyy', 0.45), ('1x01', 0.2), ('101', 0.15), ('season', 0.2))
+MOVIE_SHARE = 0.25
+
+
+def made_up_words(rng, count=5000):
+    return list({''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) for _ in range(count)})
+
+
+def title(rng, words, length=(1, 3)):
+    return ' '.join(
+        rng.choice(WORDS) if rng.random() < COMMON_SHARE else rng.choice(words)
+        for _ in range(rng.randint(*length))
+    ).title()
+
+
+def season_names(rng, words, show, style, season, episodes):
+    """ The (media, extra) relative paths of a season of a show, in one naming style """
+    dotted = show.replace(' ', '.')
+    resolution, source, group = rng.choice(RESOLUTIONS), rng.choice(SOURCES), rng.choice(GROUPS)
+    media = list()
+    extras = list()
+    if style == 'sxxeyy':
+        folder = f'{dotted}.S{season:02}.{resolution}.{source}'
+        media = [f'{folder}/{dotted}.S{season:02}E{e:02}.{resolution}.{source}.x264-{group}.mkv'
+                 for e in range(1, episodes + 1)]
+        extras = [f'{folder}/{dotted}.S{season:02}.{resolution}.{source}.nfo']
+    elif style == '1x01':
+        media = [f'{show}/{show} {season}x{e:02} {title(rng, words, (1, 2))}.avi' for e in range(1, episodes + 1)]
+        extras = [f'{show}/{show} {season}x{e:02}.srt' for e in range(1, episodes + 1, 4)]
+    elif style == '101':
+        media = [f'{dotted.lower()}.{season}{e:02}.{source.lower()}.mp4' for e in range(1, min(episodes, 99) + 1)]
+    elif style == 'season':
+        media = [f'{show}/Season {season}/Episode {e}.mkv' for e in range(1, episodes + 1)]
+        extras = [f'{show}/Season {season}/folder.txt']
+    return media, extras
+
+
+def movie_names(rng, movie, year):
+    resolution, source = rng.choice(RESOLUTIONS), rng.choice(SOURCES)
+    folder = f'{movie} ({year}) {resolution} {source} x264'
+    return [f'{folder}/{folder}.mkv'], [f'{folder}/{folder}.nfo', f'{folder}/{movie}.srt']
+
+
+def generate_library(count=100000, seed=0, existing=0.1):
+    """ The relative paths of a synthetic library; The same count and seed always give the same paths
+
+    Args:
+        count (int): The number of media files in the downloads
+        seed (int): The seed of the names
+        existing (float): The share of the shows and movies that are already in the media folder
+
+    Returns: (media, extras, library) relative paths; The media files and other files in the downloads,
+             and the media files already in the media folder
+    """
+    rng = random.Random(seed)
+    # Sorted, as the order of a set of strings changes between runs
+    words = sorted(made_up_words(rng))
+    media = list()
+    extras = list()
+    library = list()
+    # Names are made unique by a number, so shows in different styles are not grouped into each other by chance
+    numbers = Counter()
+    while len(media) < count:
+        if rng.random() < MOVIE_SHARE:
+            movie = title(rng, words, (1, 4))
+            numbers[movie] += 1
+            movie = f'{movie} {numbers[movie]}' if numbers[movie] > 1 else movie
+            year = rng.randint(1950, 2025)
+            names, others = movie_names(rng, movie, year)
+            if rng.random() < existing:
+                library.append(f'Movies/{movie} ({year}).mkv')
+        else:
+            show = title(rng, words)
+            numbers[show] += 1
+            show = f'{show} {numbers[show]}' if numbers[show] > 1 else show
+            style = rng.choices([s for s, w in STYLES], [w for s, w in STYLES])[0]
+            names = list()
+            others = list()
+            for season in range(1, rng.randint(1, 8) + 1):
+                season_media, season_extras = season_names(rng, words, show, style, season, rng.randint(6, 24))
+                names += season_media
+                others += season_extras
+            if rng.random() < existing:
+                library += [f'TV Shows/{show}/Season {s:02}/{show} s{s:02}e{e:02}.mkv'
+                            for s in range(1, 3) for e in range(1, 4)]
+        media += names
+        extras += others
+    return media[:count], extras, library
+
+
+def tmpfs_folder():
+    """ A new folder on tmpfs, so the benchmarks measure the engine rather than the disk; Else in the temp folder """
+    parent = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+    return tempfile.mkdtemp(prefix='organize-media-bench-', dir=parent)
+
+
+def build_library(folder, count=100000, seed=0, existing=0.1):
+    """ Writes a synthetic library as empty files, in the "downloads" and "media" folders of a folder
+
+    Returns: The downloads folder, the media folder, and the paths of the media files in the downloads
+    """
+    media, extras, library = generate_library(count, seed, existing)
+    downloads_path = os.path.join(folder, 'downloads')
+    media_path = os.path.join(folder, 'media')
+    os.makedirs(media_path, exist_ok=True)
+    paths = [os.path.join(downloads_path, *name.split('/')) for name in media]
+    folders = set()
+    for root, names in ((downloads_path, media + extras), (media_path, library)):
+        for name in names:
+            path = os.path.join(root, *name.split('/'))
+            parent = os.path.dirname(path)
+            if parent not in folders:
+                os.makedirs(parent, exist_ok=True)
+                folders.add(parent)
+            open(path, 'wb').close()
+    return downloads_path, media_path, paths
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    folder = sys.argv[3] if len(sys.argv) > 3 else tmpfs_folder()
+    downloads_path, media_path, paths = build_library(folder, count, seed)
+    print(f'{len(paths):,} media files in {downloads_path}')
+    print(f'Media folder: {media_path}')
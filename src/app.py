@@ -1,7 +1,9 @@
+from multiprocessing import freeze_support
 from tkinter import Tk, Toplevel, TOP, X, BOTH
 
 from screens import FreshStartup, Main, SelectMedia
-from components.data import CONFIG, Images
+from components.data import CONFIG
+from components.images import Images
 from components import TitleBar
 
 
@@ -175,5 +177,8 @@ class OrganizeMedia(Tk):
         self.window.deiconify()
 
 
-app = OrganizeMedia()
-app.mainloop()
+if __name__ == '__main__':
+    # Scan worker processes re-import this module, and must not open another window
+    freeze_support()
+    app = OrganizeMedia()
+    app.mainloop()
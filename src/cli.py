@@ -0,0 +1,304 @@
+""" Headless entry point, to organize media from cron or a download client's completion hook.
+
+    Scans, groups and organizes media files the same way as the GUI, sharing its settings, scan index, aliases and
+    organize journal, without importing tkinter or PIL. An interrupted organize run is resumed before a new one.
+    Downloads that are still in progress are left out, and reported as not_ready.
+    The report is written to stdout, as JSON or as one JSON object per line.
+    With --watch, it keeps running after the first run, and organizes new downloads as inotify reports them.
+
+    Usage:
+        python src/cli.py [paths ...] [--media PATH] [--downloads PATH] [--dry-run] [--keep-folders]
+                          [--format json|ndjson] [--undo] [--watch] [--debounce SECONDS] [--settle SECONDS]
+
+    Exit codes:
+        0 if every file was organized, 1 if any file failed to organize, 3 if files would be organized to the same path,
+        4 if any file was not a finished download; Running again later organizes it, once it has not changed since
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent
+sys.path.insert(0, str(SRC.parent))
+
+from src.components.data import CONFIG, MediaFile, MediaContainers
+from src.funcs.scanner import ScanIndex, scan_media
+from src.funcs.completeness import CompletenessGate
+from src.funcs.general import PARSER_VERSION
+from src.funcs.memo import PARSE_CACHE
+from src.funcs.aliases import AliasTable
+from src.funcs.library import LibraryIndex
+from src.funcs.mover import MoveScheduler
+from src.funcs.organizer import OrganizeJournal, plan_organize, execute_plan, delete_moved_folders
+from src.funcs.watcher import FolderWatcher
+
+EXIT_FAILED = 1
+EXIT_CONFLICTS = 3
+EXIT_NOT_READY = 4
+
+
+class Report:
+    """ Writes the records of a run to a stream; Each as a line of NDJSON as it happens, or as one JSON document """
+
+    def __init__(self, output_format='ndjson', stream=sys.stdout):
+        self.output_format = output_format
+        self.stream = stream
+        # {record type: [records]} of a JSON document
+        self.records = dict()
+
+    def add(self, record_type, **fields):
+        if self.output_format == 'ndjson':
+            self.stream.write(json.dumps({'type': record_type, **fields}) + '\n')
+            self.stream.flush()
+        else:
+            self.records.setdefault(record_type, list()).append(fields)
+
+    def close(self):
+        if self.output_format == 'json':
+            json.dump(self.records, self.stream, indent=2)
+            self.stream.write('\n')
+
+
+def step_record(step, status, error=None):
+    record = {'kind': step.kind, 'source': step.source, 'destination': step.destination, 'status': status}
+    if step.media_file is not None:
+        record['media_type'] = step.media_file.type
+        record['title'] = step.media_file.title
+    if error is not None:
+        record['error'] = str(error)
+    return record
+
+
+def scan(paths, media_path, gate):
+    """ Scans the paths, grouping the media files found, as the GUI does before it shows them
+
+    Returns: The MediaContainers, and the AliasTable
+    """
+    aliases = AliasTable(CONFIG.aliases_path)
+    aliases.learn_library(media_path)
+    if CONFIG.persist_parse_cache:
+        PARSE_CACHE.load(CONFIG.parse_cache_path, PARSER_VERSION)
+    index = ScanIndex(CONFIG.index_path, CONFIG.media_extensions)
+    media_containers = MediaContainers(aliases=aliases)
+    scan_media(paths, CONFIG.media_extensions, media_containers, index, CONFIG.scan_workers, CONFIG.scan_chunk_size,
+               gate=gate)
+    index.save()
+    if CONFIG.persist_parse_cache:
+        PARSE_CACHE.save(CONFIG.parse_cache_path, PARSER_VERSION)
+    return media_containers, aliases
+
+
+def organize(plan, journal, library, scheduler, report, keep_folders=False):
+    """ Runs a plan, reporting each step as it completes
+
+    Returns: The steps that failed
+    """
+    def on_done(step, error):
+        if error is not None:
+            status = 'failed'
+        else:
+            status = 'skipped' if step.kind == 'skip' else 'done'
+        report.add('step', **step_record(step, status, error))
+
+    failed = execute_plan(plan, journal, library, scheduler, on_done)
+    if not keep_folders:
+        for folder in delete_moved_folders(plan, failed):
+            report.add('deleted', folder=folder)
+    return failed
+
+
+def undo(journal, report):
+    for step in journal.undo():
+        report.add('undone', **step_record(step, 'undone'))
+    return 0
+
+
+def organize_containers(media_containers, aliases, paths, args, report, journal, scheduler, kept=()):
+    """ Organizes grouped media files, after finishing the organize run that was interrupted, if there was one
+
+    Args:
+        paths (tuple): The (downloads, media) folders
+        kept (iterable): The paths of the downloads that are not finished, whose folders are not deleted
+
+    Returns: The exit code
+    """
+    started = time.monotonic()
+    downloads_path, media_path = paths
+    # Only the folders of these shows are listed, so the work follows the files organized, not the size of the library
+    library = LibraryIndex(media_path)
+    library.build({c.title for c in media_containers if c.type == 'TV Show'})
+    failed = list()
+
+    # Finish the run that was interrupted, from where it stopped, before starting a new one
+    interrupted = journal.pending()
+    resumed = set()
+    if interrupted:
+        resumed = {step.source for step in interrupted.steps}
+        if args.dry_run:
+            for i, step in enumerate(interrupted.steps):
+                if i not in interrupted.completed:
+                    report.add('step', **step_record(step, 'resume'))
+        else:
+            failed += organize(interrupted, journal, library, scheduler, report, args.keep_folders)
+
+    # Leave out the files that were organized by the interrupted run
+    selected = {f.path for c in media_containers for f in c.media_files if f.path not in resumed}
+    plan = plan_organize(media_containers, media_path, downloads_path, library, selected, kept)
+    for destination, sources in plan.conflicts.items():
+        report.add('conflict', destination=destination, sources=sources)
+    if args.dry_run:
+        for step in plan.steps:
+            report.add('step', **step_record(step, 'planned'))
+    else:
+        for container in media_containers:
+            for media_file in container.media_files:
+                if media_file.path in selected:
+                    aliases.learn(media_file.title, container.title, media_file.type)
+        failed += organize(plan, journal, library, scheduler, report, args.keep_folders)
+        aliases.save()
+
+    report.add(
+        'summary',
+        dry_run=args.dry_run,
+        files=sum(len(c.media_files) for c in media_containers),
+        titles=len(media_containers),
+        moves=sum(step.kind == 'move' for step in plan.steps),
+        renames=sum(step.kind == 'rename' for step in plan.steps),
+        skips=sum(step.kind == 'skip' for step in plan.steps),
+        conflicts=len(plan.conflicts),
+        failed=len(failed),
+        seconds=round(time.monotonic() - started, 3),
+    )
+    if failed:
+        return EXIT_FAILED
+    if plan.conflicts:
+        return EXIT_CONFLICTS
+    return 0
+
+
+def report_not_ready(gate, report):
+    """ Reports the files the gate found not ready, and clears them from it
+
+    Returns: Their paths
+    """
+    not_ready = list(gate.not_ready)
+    for path in not_ready:
+        report.add('not_ready', path=path)
+    gate.not_ready.clear()
+    return not_ready
+
+
+def watch(watcher, gate, aliases, paths, args, report, journal, scheduler, waiting=()):
+    """ Organizes the new media files of each batch of the watcher, until interrupted.
+        Only the files of a batch are parsed and grouped; The downloads are never scanned again.
+        Files that are not finished downloads are handed back to the watcher, to be looked at again later,
+        and the folders holding them are not deleted meanwhile.
+
+    Args:
+        waiting (iterable): (root, path) of the downloads the first run found not finished
+    """
+    waiting = list(waiting)
+    watcher.defer(waiting, max(gate.settle_seconds, args.debounce))
+    # The paths of the files handed back to the watcher, which have not been organized since
+    waiting = {path for root, path in waiting}
+    for batch in watcher.batches():
+        media_containers = MediaContainers(aliases=aliases)
+        not_ready = list()
+        for root, path in batch:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Organized by the first run, or removed, since its event
+                continue
+            if gate.is_ready(path, stat):
+                media_containers.add(MediaFile(path, root))
+                waiting.discard(path)
+            else:
+                not_ready.append((root, path))
+                waiting.add(path)
+        report_not_ready(gate, report)
+        watcher.defer(not_ready, max(gate.settle_seconds, args.debounce))
+        if media_containers:
+            organize_containers(media_containers, aliases, paths, args, report, journal, scheduler, waiting)
+
+
+def run(args, report):
+    journal = OrganizeJournal(CONFIG.journal_path)
+    if args.undo:
+        return undo(journal, report)
+    downloads_path = args.downloads or CONFIG.paths.downloads
+    media_path = args.media or CONFIG.paths.media
+    paths = args.paths or [downloads_path]
+    if not media_path or not all(paths):
+        raise SystemExit('The downloads and media paths are not set; Pass them, or set them in the GUI first')
+
+    # Watching starts before the first scan, so the files that arrive during it are not missed
+    watcher = FolderWatcher(paths, CONFIG.media_extensions, args.debounce) if args.watch else None
+    try:
+        settle_seconds = CONFIG.download_settle_seconds if args.settle is None else args.settle
+        gate = CompletenessGate(settle_seconds, CONFIG.check_open_files)
+        media_containers, aliases = scan(paths, media_path, gate)
+        not_ready = report_not_ready(gate, report)
+        scheduler = MoveScheduler(CONFIG.move_streams_per_device, CONFIG.copy_verify, CONFIG.copy_chunk_size)
+        code = organize_containers(media_containers, aliases, (downloads_path, media_path), args, report, journal,
+                                   scheduler, not_ready)
+        if watcher is None:
+            # So a download client's hook can tell to run again, for the files that were not ready
+            return code or (EXIT_NOT_READY if not_ready else 0)
+        # The downloads that were not finished are looked at again by the watch, with the root they were found in
+        waiting = [(next(root for root in paths if path.startswith(os.path.join(root, ''))), path)
+                   for path in not_ready]
+        return watch(watcher, gate, aliases, (downloads_path, media_path), args, report, journal, scheduler,
+                     waiting)
+    finally:
+        if watcher is not None:
+            watcher.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Organize media files into the media folder, without the GUI.')
+    parser.add_argument('paths', nargs='*', help='The folders to scan; The downloads folder by default')
+    parser.add_argument('--downloads', help='The downloads folder, which is never deleted; From the settings by default')
+    parser.add_argument('--media', help='The media folder, with the Movies and TV Shows folders; From the settings by default')
+    parser.add_argument('--dry-run', action='store_true', help='Report the plan, without moving anything')
+    parser.add_argument('--keep-folders', action='store_true', help='Keep the download folders of moved files')
+    parser.add_argument('--format', dest='output_format', choices=('json', 'ndjson'), default='ndjson',
+                        help='One JSON document, or a JSON object per line as the run goes')
+    parser.add_argument('--undo', action='store_true', help='Move the files of the last organize run back')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running, and organize new files as they arrive; Linux only')
+    parser.add_argument('--debounce', type=float, default=5.0,
+                        help='The number of quiet seconds to wait for, before organizing the files that arrived')
+    parser.add_argument('--settle', type=float,
+                        help='The number of seconds a new file must be unchanged, before it is organized; '
+                             '0 to organize files that no other process is writing right away. From the settings by '
+                             'default')
+    args = parser.parse_args(argv)
+    # Relative paths given on the command line are resolved from where the command was run
+    args.paths = [os.path.abspath(path) for path in args.paths]
+    args.downloads = args.downloads and os.path.abspath(args.downloads)
+    args.media = args.media and os.path.abspath(args.media)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = Report(args.output_format)
+    cwd = os.getcwd()
+    # The settings are read relative to the src folder, the same as when the GUI runs
+    os.chdir(SRC)
+    try:
+        return run(args, report)
+    except KeyboardInterrupt:
+        # An organize run that was stopped part way is resumed by the next run
+        return 130
+    finally:
+        os.chdir(cwd)
+        report.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,6 @@
-from .title_bar import TitleBar
\ No newline at end of file
+def __getattr__(name):
+    # Imported on first use, so the Tk-free modules of the package, such as data, can be used without tkinter
+    if name == 'TitleBar':
+        from .title_bar import TitleBar
+        return TitleBar
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,12 +1,13 @@
 import os
 import json
-import yaml
 from pathlib import Path
-from difflib import SequenceMatcher, Match
+from heapq import nlargest
+from itertools import chain
+from collections import Counter
 
-from PIL import Image, ImageTk
-from dataclasses import dataclass, astuple, asdict, field
+from dataclasses import dataclass, astuple, asdict, field, InitVar
 from src.funcs.general import get_file_title, get_show_season_and_episode
+from src.funcs.aliases import AliasTable
 
 
 @dataclass
@@ -22,19 +23,15 @@ class MediaFile:
     season: int = None
     episode: int = None
     selected: bool = True
+    # The (show, season, episode, title) precomputed by classify_names
+    parsed: InitVar[tuple] = None
 
-    def __post_init__(self):
-        show, self.season, self.episode = get_show_season_and_episode(self.path)
+    def __post_init__(self, parsed):
         self.file_name = os.path.basename(self.path)
         self.extension = self.file_name.split('.')[-1].lower()
-        self.title = get_file_title(self.file_name, show)
-        # Get the file_rename
-        if show:
-            self.type = 'TV Show'
-            self.file_rename = ' '.join([self.title, f's{self.season}e{self.episode}']) + f'.{self.extension}'
-        else:
-            self.type = 'Movie'
-            self.file_rename = f'{self.title}.{self.extension}'
+        # The parsed fields are only missing if they were not restored from the ScanIndex
+        if not self.type:
+            self.parse(parsed)
         # Get the parent_dir
         if self.origin_dir == self.path:
             self.parent_dir = Path(self.path).parts[-1]
@@ -45,6 +42,25 @@ class MediaFile:
                     parent_dir.append(part)
             self.parent_dir = parent_dir[0]
 
+    def parse(self, parsed=None):
+        """ Parses the type, title, season, episode and file_rename from the path
+
+        Args:
+            parsed (tuple): The (show, season, episode, title) of the path, if it was already parsed by classify_names
+        """
+        if parsed:
+            show, self.season, self.episode, self.title = parsed
+        else:
+            show, self.season, self.episode = get_show_season_and_episode(self.path)
+            self.title = get_file_title(self.file_name, show)
+        # Get the file_rename
+        if show:
+            self.type = 'TV Show'
+            self.file_rename = ' '.join([self.title, f's{self.season}e{self.episode}']) + f'.{self.extension}'
+        else:
+            self.type = 'Movie'
+            self.file_rename = f'{self.title}.{self.extension}'
+
     def select(self, *args, **kwargs):
         self.selected = True
 
@@ -57,6 +73,8 @@ class MediaContainer:
     title: str = None
     type: str = None
     media_files: list[MediaFile] = field(default_factory=list)
+    # Whether the title is a known name from the AliasTable, which is kept as files are added
+    canonical: bool = False
 
     def add_similar_media_file(self, media_file: MediaFile, thresh: float = 0.7):
         if not self.title:
@@ -64,47 +82,203 @@ class MediaContainer:
             self.type = media_file.type
             self.media_files.append(media_file)
             return True
+        from difflib import SequenceMatcher
         sameness_ratio = SequenceMatcher(None, self.title, media_file.title).ratio()
         if sameness_ratio >= thresh and self.type == media_file.type:
-            self.media_files.append(media_file)
-            same = list()
-            for word in self.title.split(' '):
-                if word in media_file.title.split(' '):
-                    same.append(word)
-            self.title = ' '.join(same)
+            self.add_media_file(media_file)
             return True
         return False
 
+    def add_media_file(self, media_file: MediaFile):
+        """ Adds a media file known to be similar, narrowing the title down to the words both titles share """
+        self.media_files.append(media_file)
+        if self.canonical:
+            return None
+        same = list()
+        for word in self.title.split(' '):
+            if word in media_file.title.split(' '):
+                same.append(word)
+        self.title = ' '.join(same)
+
 
-class OMImage(ImageTk.PhotoImage):
+class MediaContainers:
     """
-        Extends the funcs of ImageTk.PhotoImage.
-        Allows PhotoImage fetching by path, and size declaration by width and height.
+        The MediaContainers of a scan, in the order they were created.
+
+        Each container is indexed by the character trigrams of its title, per type, so a new media file is
+        only compared to the <max_candidates> containers that share the most distinctive trigrams with its title.
+        The shared trigrams are counted from the postings of the title's distinctive trigrams, so the work per file
+        is bounded by <common>, rather than growing with the number of containers; Trigrams such as those of "720p"
+        or "HDTV" are in too many titles to tell them apart, and are not counted.
+        Those candidates are checked in creation order, through the length upper bound of SequenceMatcher's
+        real_quick_ratio before the full ratio; The first one similar enough gets the file, as with offering the
+        file to every container's add_similar_media_file.
+        A title with only common trigrams is compared to the generic containers, whose titles are mostly common
+        trigrams, and to the containers that share its trigrams, ranked the same way.
+        The episodes of a season usually share their title, so a title goes straight to the container the last file
+        with that title was added to, for as long as that container's title stays the same.
+        Titles known to the AliasTable skip all of that, and go straight to the container of their canonical name.
     """
-    def __init__(self, path, width=64, height=64, **kw):
-        self.path = path
-        self.size = (width, height)
-        self.image = self.__get_image()
-        ImageTk.PhotoImage.__init__(self, self.image, **kw)
-
-    def __get_image(self):
-        with Image.open(self.path) as img:
-            image = img.resize(self.size, Image.ANTIALIAS)
-        return image
-
-    def resize(self, width, height):
-        self.__init__(self.path, width, height)
-
 
-class Images:
-    def __init__(self):
-        self.locate_media: [OMImage] = OMImage('Images/dir.png')
-        self.select_media: [OMImage] = OMImage('Images/filter.png')
-        self.organize: [OMImage] = OMImage('Images/organize_media.png')
-        self.deselect: [OMImage] = OMImage('Images/deselect.png', 24, 24)
-        self.select: [OMImage] = OMImage('Images/select.png', 24, 24)
-        self.arrow: [OMImage] = OMImage('Images/arrow.png', 24, 24)
-        self.icon: [OMImage] = OMImage('Images/toolbar_icon.ico', 30, 30)
+    def __init__(self, thresh: float = 0.7, common: int = 64, aliases: AliasTable = None, max_candidates: int = 8):
+        """
+        Args:
+            thresh (float): The SequenceMatcher ratio a media file needs, to be added to a container
+            common (int): The number of containers a trigram can be in, before it is too common to find candidates
+            aliases (AliasTable): The known titles, and their canonical names
+            max_candidates (int): The number of containers a media file is compared to
+        """
+        # difflib is imported with the first MediaContainers, rather than at startup
+        from difflib import SequenceMatcher
+        self.__matcher_type = SequenceMatcher
+        self.thresh = thresh
+        self.common = common
+        self.aliases = aliases
+        self.max_candidates = max_candidates
+        # (type, canonical name) -> the index of its container
+        self.__canonical = dict()
+        self.containers: list[MediaContainer] = list()
+        # (type, trigram) -> the indexes of the containers with the trigram in their title
+        self.__postings = dict()
+        # The trigrams of each container's title, and how many of them are common
+        self.__trigrams = dict()
+        self.__common_counts = dict()
+        # The indexes of the containers without a title, which accept any media file,
+        # and of the containers with mostly common trigrams, which are always candidates
+        self.__untitled = set()
+        self.__generic = set()
+        # (container title, file title) -> whether they are similar; The episodes of a show share their title
+        self.__similar = dict()
+        # (type, file title) -> (the index of the container it was last added to, that container's title then)
+        self.__placed = dict()
+
+    def __iter__(self):
+        return iter(self.containers)
+
+    def __len__(self):
+        return len(self.containers)
+
+    def __getitem__(self, i):
+        return self.containers[i]
+
+    @staticmethod
+    def trigrams(title: str) -> set:
+        title = f' {title.lower()} '
+        return {title[i:i + 3] for i in range(len(title) - 2)}
+
+    def __count_common(self, indexes, n):
+        for i in indexes:
+            self.__common_counts[i] += n
+            if self.__common_counts[i] * 2 >= len(self.__trigrams[i]):
+                self.__generic.add(i)
+            else:
+                self.__generic.discard(i)
+
+    def __index(self, i):
+        container = self.containers[i]
+        if not container.title:
+            self.__untitled.add(i)
+            return None
+        self.__trigrams[i] = self.trigrams(container.title)
+        self.__common_counts[i] = 0
+        for gram in self.__trigrams[i]:
+            postings = self.__postings.setdefault((container.type, gram), set())
+            postings.add(i)
+            if len(postings) == self.common + 1:
+                # The trigram just became common, for every container that has it
+                self.__count_common(postings - {i}, 1)
+            if len(postings) > self.common:
+                self.__count_common([i], 1)
+        self.__count_common([i], 0)
+
+    def __unindex(self, i):
+        container = self.containers[i]
+        self.__untitled.discard(i)
+        self.__generic.discard(i)
+        for gram in self.__trigrams.pop(i, ()):
+            postings = self.__postings[(container.type, gram)]
+            postings.discard(i)
+            if len(postings) == self.common:
+                self.__count_common(postings, -1)
+        self.__common_counts.pop(i, None)
+
+    def candidates(self, media_file: MediaFile) -> list[int]:
+        """ The indexes of the containers that may be similar to the media file, in creation order """
+        postings = [self.__postings.get((media_file.type, gram), ()) for gram in self.trigrams(media_file.title)]
+        distinctive = [p for p in postings if len(p) <= self.common]
+        # A title with only common trigrams is generic too
+        shared = Counter(chain(*distinctive) if distinctive else chain(self.__generic, *postings))
+        # Ties go to the oldest container, the same on every run
+        best = nlargest(self.max_candidates, sorted(shared), key=shared.__getitem__)
+        return sorted(self.__untitled.union(best))
+
+    def __is_similar(self, i, matcher, length):
+        container = self.containers[i]
+        # real_quick_ratio
+        if 2 * min(length, len(container.title)) < self.thresh * (length + len(container.title)):
+            return False
+        matcher.set_seq1(container.title)
+        return matcher.ratio() >= self.thresh
+
+    def add(self, media_file: MediaFile) -> MediaContainer:
+        """ Adds the media file to the first similar MediaContainer, or to a new one
+
+        Returns: The MediaContainer the media file was added to
+        """
+        canonical = self.aliases.lookup(media_file.title, media_file.type) if self.aliases else None
+        if canonical:
+            return self.__add_to_canonical(media_file, canonical)
+        # The file title is the second sequence, which SequenceMatcher analyses once for all the candidates
+        placed = self.__placed.get((media_file.type, media_file.title))
+        if placed and self.containers[placed[0]].title == placed[1]:
+            return self.__add_to(placed[0], media_file)
+        matcher = self.__matcher_type(None, '', media_file.title)
+        length = len(media_file.title)
+        for i in self.candidates(media_file):
+            container = self.containers[i]
+            if container.title:
+                if container.type != media_file.type:
+                    continue
+                pair = (container.title, media_file.title)
+                similar = self.__similar.get(pair)
+                if similar is None:
+                    similar = self.__similar[pair] = self.__is_similar(i, matcher, length)
+                if not similar:
+                    continue
+            return self.__add_to(i, media_file)
+        container = MediaContainer()
+        container.add_similar_media_file(media_file, self.thresh)
+        self.containers.append(container)
+        self.__index(len(self.containers) - 1)
+        self.__placed[(media_file.type, media_file.title)] = (len(self.containers) - 1, container.title)
+        return container
+
+    def __add_to(self, i, media_file: MediaFile) -> MediaContainer:
+        container = self.containers[i]
+        title = container.title
+        if container.title:
+            container.add_media_file(media_file)
+        else:
+            container.add_similar_media_file(media_file, self.thresh)
+        # Most files leave the title as it was, and the container indexed as it was
+        if container.title != title or not title:
+            self.__unindex(i)
+            self.__index(i)
+        self.__placed[(media_file.type, media_file.title)] = (i, container.title)
+        return container
+
+    def __add_to_canonical(self, media_file: MediaFile, canonical: str) -> MediaContainer:
+        i = self.__canonical.get((media_file.type, canonical))
+        if i is not None:
+            container = self.containers[i]
+            container.add_media_file(media_file)
+            return container
+        container = MediaContainer(title=canonical, type=media_file.type, media_files=[media_file], canonical=True)
+        self.containers.append(container)
+        self.__canonical[(media_file.type, canonical)] = len(self.containers) - 1
+        # Indexed, so unknown variants of the title can still be matched to it
+        self.__index(len(self.containers) - 1)
+        return container
 
 
 @dataclass
@@ -170,24 +344,88 @@ class Settings:
     paths: [Paths] = Paths()
     settings_path: str = 'settings/config.yaml'
     cache_path: str = 'settings/cache'
+    index_path: str = 'settings/scan_index'
+    scan_chunk_size: int = 1000
+    # The number of processes that parse file names during a scan; 0 parses them on the scanning thread
+    scan_workers: int = 0
+    parse_cache_path: str = 'settings/parse_cache'
+    aliases_path: str = 'settings/aliases'
+    journal_path: str = 'settings/organize_journal'
+    image_cache_path: str = 'settings/image_cache'
+    persist_parse_cache: bool = True
+    # The number of files that may be moved from, or to, the same disk at once
+    move_streams_per_device: int = 1
+    # How files copied to another disk are checked before the original is removed; "size", "checksum" or None
+    copy_verify: str = 'size'
+    copy_chunk_size: int = 64 * 1024 * 1024
+    # New or changed files are left for a later scan until they have not changed for this many seconds
+    download_settle_seconds: int = 60
+    # Whether new or changed files are checked for a download client still writing them, where the platform can tell
+    check_open_files: bool = True
+
+
+def load_yaml(path):
+    """ Reads a YAML file, with the C loader of libyaml if PyYAML was built with it """
+    import yaml
+    with open(path) as file:
+        return yaml.load(file, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+class LazySettings:
+    """
+        The Settings, whose settings files are read the first time a field that comes from them is used.
 
+        Importing this module reads no files, and the fields with fixed defaults, such as the colors and fonts
+        used by the widgets' default arguments, are available without reading them.
+    """
+    # The optional fields of config.yaml, which keep their defaults when the file does not have them
+    CONFIG_FIELDS = (
+        'scan_workers', 'scan_chunk_size', 'persist_parse_cache', 'move_streams_per_device', 'copy_verify',
+        'copy_chunk_size', 'download_settle_seconds', 'check_open_files',
+    )
+    # The fields that the settings files can change
+    FILE_FIELDS = {'geometry', 'media_extensions', 'paths', *CONFIG_FIELDS}
 
-# Instantiate the Settings as CONFIG
-_settings = {
-    'media_extensions': {'mp4', 'mkv', 'avi', 'flv', 'wmv', 'webm', 'm4p', 'mov', 'm4v', 'mpg', '3gp'}
-}
-if os.path.exists('settings/cache'):
-    with open('settings/cache') as file:
-        _cache = json.load(file)
-    _settings['geometry'] = Geometry(**_cache['geometry']).to_str()
-if os.path.exists('settings/config.yaml'):
-    with open('settings/config.yaml') as file:
-        _config = yaml.safe_load(file)
-    _settings['media_extensions'] = _config['media_extensions']
-    _settings['paths'] = Paths(**_config['paths'])
-
-CONFIG = Settings(**_settings)
-
+    def __init__(self):
+        self.__dict__['_settings'] = Settings(
+            media_extensions={'mp4', 'mkv', 'avi', 'flv', 'wmv', 'webm', 'm4p', 'mov', 'm4v', 'mpg', '3gp'}
+        )
+        self.__dict__['_loaded'] = False
+
+    def __getattr__(self, name):
+        if name in self.FILE_FIELDS and not self._loaded:
+            self.load()
+        return getattr(self._settings, name)
+
+    def __setattr__(self, name, value):
+        if name in self.FILE_FIELDS and not self._loaded:
+            self.load()
+        setattr(self._settings, name, value)
+
+    def load(self):
+        """ Reads the settings files into the Settings.
+            Both files are read before any field is changed, and an error is raised again by every later access
+            to a field from them, until they can be read, rather than leaving the defaults in place.
+        """
+        cache = config = None
+        if os.path.exists(self._settings.cache_path):
+            with open(self._settings.cache_path) as file:
+                cache = json.load(file)
+        if os.path.exists(self._settings.settings_path):
+            config = load_yaml(self._settings.settings_path)
+        if cache is not None:
+            self._settings.geometry = Geometry(**cache['geometry']).to_str()
+        if config is not None:
+            self._settings.media_extensions = config['media_extensions']
+            self._settings.paths = Paths(**config['paths'])
+            for name in self.CONFIG_FIELDS:
+                if name in config:
+                    setattr(self._settings, name, config[name])
+        self.__dict__['_loaded'] = True
+
+
+# The Settings, read from the settings files when first needed
+CONFIG = LazySettings()
 
 if __name__ == '__main__':
     file_path = 'Family Guy/Season 2/family.guy.s2e10.avi'
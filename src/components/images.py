@@ -0,0 +1,69 @@
+import os
+
+from PIL import Image, ImageTk
+
+from .data import CONFIG
+
+
+# Image.ANTIALIAS was removed in Pillow 10; LANCZOS is the same filter
+LANCZOS = getattr(Image, 'Resampling', Image).LANCZOS
+
+
+class OMImage(ImageTk.PhotoImage):
+    """
+        Extends the funcs of ImageTk.PhotoImage.
+        Allows PhotoImage fetching by path, and size declaration by width and height.
+
+        Use OMImage.get to share one image of each (path, width, height) across the whole process.
+        Resized images are saved to the image cache folder, so later launches load them without resampling.
+    """
+    # {(path, width, height): OMImage} of the images created so far
+    cache = dict()
+
+    def __init__(self, path, width=64, height=64, **kw):
+        self.path = path
+        self.size = (width, height)
+        self.image = self.__get_image()
+        ImageTk.PhotoImage.__init__(self, self.image, **kw)
+
+    @classmethod
+    def get(cls, path, width=64, height=64):
+        """ The shared image of the path at the size, created the first time it is asked for """
+        key = (path, width, height)
+        if key not in cls.cache:
+            cls.cache[key] = cls(path, width, height)
+        return cls.cache[key]
+
+    def __get_image(self):
+        width, height = self.size
+        cached_path = os.path.join(CONFIG.image_cache_path, f'{os.path.basename(self.path)}.{width}x{height}.png')
+        try:
+            if os.stat(cached_path).st_mtime >= os.stat(self.path).st_mtime:
+                with Image.open(cached_path) as img:
+                    return img.copy()
+        except OSError:
+            pass
+        with Image.open(self.path) as img:
+            image = img.resize(self.size, LANCZOS)
+        try:
+            os.makedirs(CONFIG.image_cache_path, exist_ok=True)
+            image.save(cached_path)
+        except (OSError, ValueError):
+            # The cache is only an optimization
+            pass
+        return image
+
+    def resize(self, width, height):
+        """ The shared image of the same path, at another size """
+        return OMImage.get(self.path, width, height)
+
+
+class Images:
+    def __init__(self):
+        self.locate_media: [OMImage] = OMImage.get('Images/dir.png')
+        self.select_media: [OMImage] = OMImage.get('Images/filter.png')
+        self.organize: [OMImage] = OMImage.get('Images/organize_media.png')
+        self.deselect: [OMImage] = OMImage.get('Images/deselect.png', 24, 24)
+        self.select: [OMImage] = OMImage.get('Images/select.png', 24, 24)
+        self.arrow: [OMImage] = OMImage.get('Images/arrow.png', 24, 24)
+        self.icon: [OMImage] = OMImage.get('Images/toolbar_icon.ico', 30, 30)
@@ -0,0 +1,204 @@
+from tkinter import *
+
+from .data import CONFIG
+from .images import Images
+from src.funcs.media_tree import MediaTree
+
+
+class VirtualTree(Frame):
+    """
+        A tree of checkboxes drawn on a single Canvas, replacing a CheckBox widget per row.
+
+        Only the rows in view are drawn, by a pool of canvas items that is reused as the tree scrolls,
+        so memory and drawing time follow the height of the view rather than the number of files.
+        Each group counts its selected items, so a group's tri-state checkbox is drawn without visiting its subtree.
+        The rows are read from a MediaTree, which can be given, or filled with the same items dictionary as CheckBoxes.
+    """
+
+    def __init__(self, widget, items_dict=None,
+                 model=None,
+                 bg=CONFIG.colors.main,
+                 header_bg=CONFIG.colors.special,
+                 selected_bg=CONFIG.colors.sub,
+                 highlight_bg=CONFIG.colors.special,
+                 fg=CONFIG.colors.font,
+                 row_height=30,
+                 indent=30,
+                 *args, **kwargs):
+        Frame.__init__(self, widget, bg=bg, bd=0, *args, **kwargs)
+        self.bg = bg
+        self.header_bg = header_bg
+        self.selected_bg = selected_bg
+        self.highlight_bg = highlight_bg
+        self.fg = fg
+        self.row_height = row_height
+        self.indent = indent
+        self.__images = Images()
+
+        self.model = model if model is not None else MediaTree()
+        # The nodes in view when scrolled, in order; The children of collapsed nodes are left out
+        self.__rows = list()
+        # The canvas items of each drawn row: [background, checkbox, partial mark, text]
+        self.__pool = list()
+        self.__hover = None
+        self.__tooltip_id = None
+        self.__tooltip_widget = None
+
+        self.canvas = Canvas(self, bg=bg, bd=0, highlightthickness=0, yscrollincrement=row_height)
+        self.ybar = Scrollbar(self, command=self.canvas.yview, orient=VERTICAL)
+        self.canvas.config(yscrollcommand=self.__on_scroll)
+        self.ybar.pack(side=RIGHT, fill=Y)
+        self.canvas.pack(side=LEFT, fill=BOTH, expand=True)
+
+        self.canvas.bind('<Configure>', lambda e: self.__draw())
+        self.canvas.bind('<Button-1>', self.__on_click)
+        self.canvas.bind('<Motion>', self.__on_motion)
+        self.canvas.bind('<Leave>', lambda e: self.__set_hover(None))
+        self.canvas.bind('<MouseWheel>', lambda e: self.__scroll(int(-1 * (e.delta / 120))))
+        self.canvas.bind('<Button-4>', lambda e: self.__scroll(-1))
+        self.canvas.bind('<Button-5>', lambda e: self.__scroll(1))
+
+        if items_dict:
+            self.model.add_items(items_dict)
+        self.refresh()
+
+    # Model
+
+    def add_items(self, items_dict):
+        """ Adds the items of a dictionary next to the existing items; See CheckBoxes.add_items """
+        self.model.add_items(items_dict)
+        self.refresh()
+
+    def add_files(self, files, selected=None):
+        """ Adds media files next to the existing items; See MediaTree.add_files """
+        self.model.add_files(files, selected)
+        self.refresh()
+
+    def toggle(self, node):
+        """ Selects every item under the node, or deselects them if they are all selected already.
+            The selection is changed in the model, and only the rows in view are redrawn.
+        """
+        self.model.toggle(node)
+        self.__draw()
+
+    def toggle_expanded(self, node):
+        if node.children is None:
+            return None
+        self.model.set_expanded(node, not node.expanded)
+        self.refresh()
+
+    def refresh(self):
+        """ Lists the rows in view, and redraws them; Called after the model changes """
+        self.__rows = self.model.rows()
+        self.canvas.config(scrollregion=(0, 0, 0, len(self.__rows) * self.row_height))
+        self.__draw()
+
+    # View
+
+    def __on_scroll(self, first, last):
+        self.ybar.set(first, last)
+        self.__draw()
+
+    def __scroll(self, units):
+        self.canvas.yview_scroll(units, 'units')
+
+    def __visible_range(self):
+        top = int(self.canvas.canvasy(0) // self.row_height)
+        count = self.canvas.winfo_height() // self.row_height + 2
+        return max(0, top), count
+
+    def __draw(self):
+        """ Draws the rows in view with the pooled canvas items, creating more only if the view grew """
+        top, count = self.__visible_range()
+        while len(self.__pool) < count:
+            self.__pool.append((
+                self.canvas.create_rectangle(0, 0, 0, 0, width=0),
+                self.canvas.create_image(0, 0, anchor=W),
+                self.canvas.create_rectangle(0, 0, 0, 0, width=0, fill=CONFIG.colors.special_alt),
+                self.canvas.create_text(0, 0, anchor=W, fill=self.fg),
+            ))
+        width = self.canvas.winfo_width()
+        for i, (background, checkbox, partial, text) in enumerate(self.__pool):
+            row = top + i
+            if row >= len(self.__rows) or i >= count:
+                for item in (background, checkbox, partial, text):
+                    self.canvas.itemconfig(item, state=HIDDEN)
+                continue
+            node = self.__rows[row]
+            y = row * self.row_height
+            middle = y + self.row_height // 2
+            x = 4 + node.depth * self.indent
+            if node.header:
+                fill = self.header_bg
+            elif node is self.__hover:
+                fill = self.highlight_bg
+            else:
+                fill = self.selected_bg if self.model.count(node)[0] else self.bg
+            self.canvas.coords(background, 0, y + 1, width, y + self.row_height - 1)
+            self.canvas.itemconfig(background, fill=fill, state=NORMAL)
+            state = self.model.state(node)
+            image = self.__images.deselect if state == 'all' else self.__images.select
+            self.canvas.coords(checkbox, x, middle)
+            self.canvas.itemconfig(checkbox, image=image, state=NORMAL)
+            # Some of the items under the node are selected; An empty box, with a mark in it
+            self.canvas.coords(partial, x + 8, middle - 4, x + 16, middle + 4)
+            self.canvas.itemconfig(partial, state=NORMAL if state == 'some' else HIDDEN)
+            if node.header:
+                font = CONFIG.fonts.large
+            elif node.children is not None:
+                font = CONFIG.fonts.small
+            else:
+                font = CONFIG.fonts.xsmall
+            self.canvas.coords(text, x + 30, middle)
+            self.canvas.itemconfig(text, text=node.text, font=font, state=NORMAL)
+
+    def __node_at(self, y):
+        row = int(self.canvas.canvasy(y) // self.row_height)
+        return self.__rows[row] if 0 <= row < len(self.__rows) else None
+
+    def __on_click(self, event):
+        node = self.__node_at(event.y)
+        if node is None:
+            return None
+        x = 4 + node.depth * self.indent
+        # The checkbox toggles the selection, and the rest of the row expands or collapses it
+        if x <= event.x <= x + 24 or node.children is None:
+            self.toggle(node)
+        else:
+            self.toggle_expanded(node)
+
+    def __on_motion(self, event):
+        self.__set_hover(self.__node_at(event.y))
+
+    def __set_hover(self, node):
+        if node is self.__hover:
+            return None
+        self.__hover = node
+        self.__hide_tooltip()
+        if node is not None and node.tooltip:
+            self.__tooltip_id = self.after(500, self.__show_tooltip)
+        self.__draw()
+
+    def __show_tooltip(self):
+        self.__tooltip_id = None
+        if self.__hover is None:
+            return None
+        x = self.winfo_pointerx() + 10
+        y = self.winfo_pointery() + 10
+        # creates a toplevel window
+        self.__tooltip_widget = Toplevel(self)
+        # Leaves only the label and removes the app window
+        self.__tooltip_widget.wm_overrideredirect(True)
+        self.__tooltip_widget.wm_geometry(f"+{x}+{y}")
+        label = Label(self.__tooltip_widget, text=self.__hover.tooltip, justify='left',
+                      background=self.highlight_bg, foreground=self.fg, relief='solid', borderwidth=1,
+                      wraplength=180)
+        label.pack(ipadx=1)
+
+    def __hide_tooltip(self):
+        if self.__tooltip_id:
+            self.after_cancel(self.__tooltip_id)
+            self.__tooltip_id = None
+        if self.__tooltip_widget:
+            self.__tooltip_widget.destroy()
+            self.__tooltip_widget = None
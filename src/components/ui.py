@@ -1,5 +1,7 @@
+from bisect import bisect_right
 from tkinter import *
-from .data import Images, CONFIG
+from .data import CONFIG
+from .images import Images
 
 
 class ScrollFrame(Frame):
@@ -498,23 +500,41 @@ class CheckBoxes(Frame):
         self.bg = bg
         self.fg = fg
         self.font = font
+        # {top level key: ScrollFrame}, and {(keys, ...): CheckBox} of the checkboxes generated so far
+        self.__headers = dict()
+        self.__checkboxes = dict()
+        self.add_items(items_dict)
+
+    def add_items(self, items_dict):
+        """ Adds the items of a dictionary, shaped like the one given at creation, next to the existing items.
+            Keys that already exist are merged into, and list items are kept sorted by their file_rename.
+        """
         # The first level of the dictionary is considered the header
         for top_level_key, next_dict in items_dict.items():
-            container = Frame(self, bg=self.bg)
-            container.pack(side=LEFT, anchor=NW, fill=BOTH, expand=True)
-            frame = ScrollFrame(container, bg=self.bg)
-            title = Label(frame, text=top_level_key, bg=self.bg, fg=self.fg, font=self.font, anchor=NW, justify=LEFT)
-            title.pack(side=TOP, fill=X, anchor=W)
-            self.generate_checkboxes(frame, next_dict)
-
-    def generate_checkboxes(self, widget, dictionary):
+            if top_level_key not in self.__headers:
+                container = Frame(self, bg=self.bg)
+                container.pack(side=LEFT, anchor=NW, fill=BOTH, expand=True)
+                frame = ScrollFrame(container, bg=self.bg)
+                title = Label(frame, text=top_level_key, bg=self.bg, fg=self.fg, font=self.font, anchor=NW,
+                              justify=LEFT)
+                title.pack(side=TOP, fill=X, anchor=W)
+                self.__headers[top_level_key] = frame
+            self.generate_checkboxes(self.__headers[top_level_key], next_dict, (top_level_key,))
+
+    def generate_checkboxes(self, widget, dictionary, keys=()):
         """ Recursively generates nested checkboxes from the provided dictionary """
         for k, v in dictionary.items():
-            checkbox = CheckBox(widget, text=k, font=CONFIG.fonts.small)
-            checkbox.pack(side=TOP, fill=X, anchor=NW)
+            checkbox = self.__checkboxes.get(keys + (k,))
+            if checkbox is None:
+                checkbox = CheckBox(widget, text=k, font=CONFIG.fonts.small)
+                checkbox.pack(side=TOP, fill=X, anchor=NW)
+                self.__checkboxes[keys + (k,)] = checkbox
             if isinstance(v, dict):
-                self.generate_checkboxes(checkbox.content_frame, v)
+                self.generate_checkboxes(checkbox.content_frame, v, keys + (k,))
             elif isinstance(v, list):
+                # The existing items, and their texts, in sorted order
+                items = [c for c in checkbox.content_frame.pack_slaves() if c.__dict__.get('name') == 'CheckBox']
+                texts = [c.title.cget('text') for c in items]
                 for item in v:
                     on_toggle_off = item.pop('on_toggle_off', None)
                     on_toggle_on = item.pop('on_toggle_on', None)
@@ -529,4 +549,13 @@ class CheckBoxes(Frame):
                         on_toggle_on=on_toggle_on,
                         metadata=metadata
                     )
-                    content_checkbox.pack(side=TOP, fill=X, anchor=NW)
+                    # Keep the items sorted, when they are added to existing ones
+                    i = bisect_right(texts, item.get('file_rename'))
+                    if i < len(items):
+                        content_checkbox.pack(side=TOP, fill=X, anchor=NW, before=items[i])
+                    else:
+                        content_checkbox.pack(side=TOP, fill=X, anchor=NW)
+                    items.insert(i, content_checkbox)
+                    texts.insert(i, item.get('file_rename'))
+                    if item.get('selected') is False:
+                        content_checkbox.toggle_checkbox()
@@ -0,0 +1,65 @@
+from itertools import count
+from queue import SimpleQueue, Empty
+from tkinter import TclError
+
+
+class UpdateChannel:
+    """
+        Carries widget updates from worker threads to the Tk main loop.
+
+        Workers post updates to a queue, which the main loop drains with after() at a bounded rate.
+        Updates posted under a key replace any of the same key that are still waiting, so a worker can post
+        its status for every file, while the progress bar is only restyled <rate> times a second.
+    """
+
+    def __init__(self, widget, rate=30):
+        """
+        Args:
+            widget (Widget): The widget whose main loop runs the updates
+            rate (int): The maximum number of times a second the updates are run
+        """
+        self.widget = widget
+        self.interval = max(1, int(1000 / rate))
+        self.__queue = SimpleQueue()
+        self.__after_id = self.widget.after(self.interval, self.__drain)
+
+    def post(self, key, func, *args, **kwargs):
+        """ Runs func(*args, **kwargs) on the main loop, unless another update is posted under the same key first
+
+        Args:
+            key (str): The key of the update, such as "status"; None to never drop the update
+            func (function): The widget update
+        """
+        self.__queue.put((key, func, args, kwargs))
+
+    def call(self, func, *args, **kwargs):
+        """ Runs func(*args, **kwargs) on the main loop, in order with the other updates """
+        self.post(None, func, *args, **kwargs)
+
+    def __drain(self):
+        updates = dict()
+        order = count()
+        while True:
+            try:
+                key, func, args, kwargs = self.__queue.get_nowait()
+            except Empty:
+                break
+            # Keyed updates replace the previous update of their key, and take its place at the end
+            key = (key,) if key is not None else next(order)
+            updates.pop(key, None)
+            updates[key] = (func, args, kwargs)
+        for func, args, kwargs in updates.values():
+            try:
+                func(*args, **kwargs)
+            except TclError:
+                # The widget was destroyed while the update was waiting
+                pass
+        try:
+            self.__after_id = self.widget.after(self.interval, self.__drain)
+        except TclError:
+            self.__after_id = None
+
+    def close(self):
+        if self.__after_id is not None:
+            self.widget.after_cancel(self.__after_id)
+            self.__after_id = None
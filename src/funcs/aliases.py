@@ -0,0 +1,96 @@
+import os
+import re
+import json
+
+NON_ALPHANUMERIC_REGEX = re.compile(r'[^a-z0-9]+')
+# The normalized words of release tags; The resolution, source, codec and audio that scene names put after the title
+RELEASE_TAG_REGEX = re.compile(
+    r'^(?:\d{3,4}[pi]|4k|uhd|hdtv|pdtv|web|dl|webrip|bluray|bdrip|brrip|dvdrip|hdrip|remux|'
+    r'[xh]26[45]|hevc|avc|xvid|divx|aac|ac3|dts|ddp?5|atmos|10bit|hdr|proper|repack|internal)$'
+)
+
+
+def normalize_title(title: str) -> str:
+    """ The lowercased words of a title, separated by single spaces; "the.office.US" -> "the office us" """
+    return NON_ALPHANUMERIC_REGEX.sub(' ', title.lower()).strip()
+
+
+class AliasTable:
+    """
+        Persisted table of normalized titles, and the canonical show or movie name they belong to.
+
+        Learned from the titles of previous organize runs, and from the folder names already in the
+        media folder's "TV Shows" folder, so known titles can be grouped with a dictionary lookup.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The path to the alias table file
+        """
+        self.path = path
+        # {normalized title: [canonical name, type]}
+        self.aliases = dict()
+        self.load()
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as file:
+                self.aliases = json.load(file)
+        except (OSError, ValueError):
+            self.aliases = dict()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w') as file:
+            json.dump(self.aliases, file, indent=2, sort_keys=True)
+
+    def learn(self, title: str, canonical: str, kind: str):
+        """
+        Args:
+            title (str): A title as parsed from a file name
+            canonical (str): The name the title belongs to
+            kind (str): The type of media; "TV Show" or "Movie"
+        """
+        key = normalize_title(title)
+        if key and canonical:
+            self.aliases[key] = [canonical, kind]
+
+    def learn_library(self, media_path: str):
+        """ Learns the names of the show folders in <media_path>/TV Shows """
+        try:
+            with os.scandir(os.path.join(media_path, 'TV Shows')) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        self.learn(entry.name, entry.name, 'TV Show')
+        except OSError:
+            return None
+
+    def lookup(self, title: str, kind: str):
+        """ The canonical name of a title, if it is known.
+
+            TV Show titles usually keep whatever followed the episode in the file name ("Show Name 720P Hdtv Grp"),
+            so the words from their first release tag on are dropped before the lookup. The rest of the title must
+            match exactly; "House Of Cards" is not "House".
+
+        Args:
+            title (str): A title as parsed from a file name
+            kind (str): The type of media; "TV Show" or "Movie"
+
+        Returns: The canonical name, or None
+        """
+        words = normalize_title(title).split(' ')
+        alias = self.aliases.get(' '.join(words))
+        if not alias and kind == 'TV Show':
+            for n, word in enumerate(words):
+                if n and RELEASE_TAG_REGEX.match(word):
+                    alias = self.aliases.get(' '.join(words[:n]))
+                    break
+        if alias and alias[1] == kind:
+            return alias[0]
+        return None
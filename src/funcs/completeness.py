@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+import errno
+
+# The suffixes download clients give to the files they are still writing, or to the control files beside them;
+# "movie.mkv.part" (Firefox), "movie.mkv.crdownload" (Chrome), "movie.mkv.!qB" (qBittorrent), "movie.mkv.aria2" (aria2)
+PARTIAL_SUFFIXES = ('.part', '.crdownload', '.!qb', '.aria2', '.partial')
+
+
+def has_partial_marker(path, names=None):
+    """ Whether a partial download marker is beside the file
+
+    Args:
+        path (str): The path to the file
+        names (set): The lowercased names of the files in its folder, if they were listed; Else the markers are stat'd
+    """
+    name = os.path.basename(path).lower()
+    if names is not None:
+        return any(name + suffix in names for suffix in PARTIAL_SUFFIXES)
+    return any(os.path.lexists(path + suffix) for suffix in PARTIAL_SUFFIXES)
+
+
+def is_open_for_writing(path):
+    """ Whether another process has the file open for writing, told without reading any of its data
+
+        On Linux, a read lease can only be taken on a file that no process has open for writing.
+        On Windows, a file cannot be opened without sharing reads and writes, while another process is writing it.
+
+    Returns: True or False, or None if it cannot be told on this platform or file system
+    """
+    if sys.platform.startswith('linux'):
+        return _has_writer_lease_check(path)
+    if os.name == 'nt':
+        return _has_writer_share_check(path)
+    return None
+
+
+def _has_writer_lease_check(path):
+    import fcntl
+    # F_SETLEASE is in the fcntl module from Python 3.12
+    set_lease = getattr(fcntl, 'F_SETLEASE', 1024)
+    try:
+        # O_NONBLOCK, so the open fails rather than waits, if another process holds a lease on the file
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return None
+    try:
+        fcntl.fcntl(fd, set_lease, fcntl.F_RDLCK)
+    except OSError as e:
+        # EACCES if the file is not ours, and EINVAL on file systems without leases, such as NFS and SMB
+        return True if e.errno == errno.EAGAIN else None
+    else:
+        fcntl.fcntl(fd, set_lease, fcntl.F_UNLCK)
+        return False
+    finally:
+        os.close(fd)
+
+
+def _has_writer_share_check(path):
+    import ctypes
+    from ctypes import wintypes
+    generic_read = 0x80000000
+    file_share_read = 0x00000001
+    open_existing = 3
+    error_sharing_violation = 32
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.CreateFileW.argtypes = (wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                     wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE)
+    kernel32.CreateFileW.restype = wintypes.HANDLE
+    # Other readers, such as a media server, are allowed; A writer makes the open fail with a sharing violation
+    handle = kernel32.CreateFileW(path, generic_read, file_share_read, None, open_existing, 0, None)
+    if handle == wintypes.HANDLE(-1).value:
+        return True if ctypes.get_last_error() == error_sharing_violation else None
+    kernel32.CloseHandle(handle)
+    return False
+
+
+class CompletenessGate:
+    """
+        Decides whether a media file is a finished download, from its name, its stat and its folder's listing.
+
+        A file is left for a later scan if a partial download marker is beside it, if it has changed within
+        <settle_seconds> and the last scan did not see it unchanged, or if another process has it open for writing.
+        A file that the last scan left out, and that has not changed since, has settled whatever its age.
+        The file's data is never read; The open-for-writing check only opens new or changed files, and only if
+        check_open is set.
+    """
+
+    def __init__(self, settle_seconds=60, check_open=True):
+        """
+        Args:
+            settle_seconds (float): The number of seconds a file must be unchanged, unless the last scan saw it
+            check_open (bool): Whether to check if another process has a new or changed file open for writing
+        """
+        self.settle_seconds = settle_seconds
+        self.check_open = check_open
+        # The paths of the files that were found not to be ready
+        self.not_ready = list()
+
+    def has_marker(self, path, names=None):
+        """ Whether a partial download marker is beside the file; See has_partial_marker """
+        if has_partial_marker(path, names):
+            self.not_ready.append(path)
+            return True
+        return False
+
+    def is_settled(self, path, stat, unchanged=False, stable=False):
+        """ Whether the file has stopped changing, and no other process is writing it
+
+        Args:
+            path (str): The path to the file
+            stat (os.stat_result): The current stat of the file
+            unchanged (bool): Whether the last scan saw the file with the same size and mtime
+            stable (bool): Whether the last scan saw the file not ready, with the same size and mtime
+        """
+        settled = unchanged or (
+            (stable or time.time() - stat.st_mtime >= self.settle_seconds)
+            and not (self.check_open and is_open_for_writing(path))
+        )
+        if not settled:
+            self.not_ready.append(path)
+        return settled
+
+    def is_ready(self, path, stat, unchanged=False):
+        """ Whether the file is ready to be organized; Its partial download markers are stat'd """
+        return not self.has_marker(path) and self.is_settled(path, stat, unchanged)
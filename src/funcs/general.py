@@ -2,7 +2,14 @@ import re
 import os
 from pathlib import Path
 from datetime import date
+from dataclasses import dataclass, field
+from collections import deque
 
+from src.funcs.memo import PARSE_CACHE
+
+# Raised whenever a change to the patterns or parsing changes their results, so the results saved by older versions
+# are parsed again
+PARSER_VERSION = 2
 
 SEASON_EPISODE_PATTERNS = [
     # Season 1 Episode 1 or Season 01 Episode 01
@@ -32,6 +39,7 @@ EPISODE_PATTERNS = [
 ]
 
 
+@PARSE_CACHE.memoize
 def initcap_file_name(file_name):
     extension = file_name.split('.')[-1] if '.' in file_name else ''
     new_string = file_name.replace(extension, '')
@@ -41,44 +49,142 @@ def initcap_file_name(file_name):
     return new_string
 
 
-def generate_show_patterns(show_pattern: str) -> str:
+SHOW_PATTERN_WRAPPERS = [
     # Start of line + show_pattern + end of line
-    yield show_pattern.join([r'^(', r')$'])
+    r'^{}$',
     # Non word or num + show_pattern + end of line
-    yield show_pattern.join([r'[^\w\d(](', r')$'])
+    r'[^\w\d(]{}$',
     # Start of line + show_pattern + Non word or num
-    yield show_pattern.join([r'^(', r')[^\w\d)]'])
+    r'^{}[^\w\d)]',
     # Non word or num + show_pattern + Non word or num
-    yield show_pattern.join([r'[^\w\d(](', r')[^\w\d)]'])
+    r'[^\w\d(]{}[^\w\d)]'
+]
 
 
-def get_show_season_and_episode(file_path: str) -> tuple[str, str, str]:
+def generate_show_patterns(show_pattern: str) -> str:
+    for wrapper in SHOW_PATTERN_WRAPPERS:
+        yield wrapper.format(f'({show_pattern})')
 
-    def get_show_from_patterns(patterns):
-        for media_pattern in patterns:
-            for pattern in generate_show_patterns(media_pattern):
-                found = re.findall(pattern, file_name, re.IGNORECASE)
-                if found:
-                    return found[0]
-        return ''
 
-    file_name = os.path.basename(file_path)
-    # Determine the Season # from folders along the files directory
-    show = get_show_from_patterns(SEASON_EPISODE_PATTERNS)
+def compile_show_patterns(patterns: list[str], multiline: bool = False) -> re.Pattern:
+    """ Compiles the patterns into a single zero-width pattern, matched with .finditer() in one pass over a string.
+
+        At each position that starts a show pattern, between the same boundaries as SHOW_PATTERN_WRAPPERS,
+        the first pattern in priority order that matches there is captured, in a named group (p<pattern>).
+        best_show_match picks the match of the highest priority pattern and wrapper from them;
+        The same result as trying each pattern in every wrapper in turn with re.findall.
+
+        The multiline variant matches a newline delimited buffer of names, with find_show_patterns.
+        Its character classes exclude newlines, so no pattern can match across two names.
+
+    Args:
+        patterns (list): The patterns, in priority order
+        multiline (bool): Whether to compile the multiline variant
+
+    Returns: The compiled pattern
+    """
+    alternatives = '|'.join(f'(?P<p{i}>{pattern})' for i, pattern in enumerate(patterns))
+    regex = rf'(?:^|(?<=[^\w\d(]))(?=(?:{alternatives})(?:$|[^\w\d)]))'
+    if multiline:
+        return re.compile(regex.replace(r'[^\w\d', r'[^\n\w\d'), re.IGNORECASE | re.MULTILINE)
+    return re.compile(regex, re.IGNORECASE)
+
+
+SEASON_EPISODE_REGEX = compile_show_patterns(SEASON_EPISODE_PATTERNS)
+EPISODE_REGEX = compile_show_patterns(EPISODE_PATTERNS)
+SEASON_EPISODE_LINES_REGEX = compile_show_patterns(SEASON_EPISODE_PATTERNS, multiline=True)
+EPISODE_LINES_REGEX = compile_show_patterns(EPISODE_PATTERNS, multiline=True)
+SEASON_FOLDER_REGEX = re.compile(r'season (\d+)', re.IGNORECASE)
+NUMBER_REGEX = re.compile(r'\d+')
+
+
+def best_show_match(matches, start: int, end: int) -> tuple:
+    """ The highest priority of the matches of a pattern from compile_show_patterns, in one name.
+
+        Patterns are ranked by their priority, and then by their wrapper in SHOW_PATTERN_WRAPPERS;
+        The whole name, the end of the name, the start of the name, and then anywhere in it, leftmost first.
+
+    Args:
+        matches (iterable): The matches in the name, in order
+        start (int): The offset of the name's first character
+        end (int): The offset past the name's last character
+
+    Returns: (show, (start, end)) of the match, with the span relative to the name, or ('', None)
+    """
+    best = None
+    best_rank = None
+    for match in matches:
+        # The groups are numbered in priority order
+        group = match.lastindex
+        match_start, match_end = match.span(group)
+        rank = (group, (match_start != start) + 2 * (match_end != end))
+        if best_rank is None or rank < best_rank:
+            best, best_rank = (match.group(group), (match_start - start, match_end - start)), rank
+    return best or ('', None)
+
+
+def find_show_pattern(file_name: str, regex: re.Pattern) -> str:
+    """ The text matched by the highest priority pattern of a regex from compile_show_patterns, or '' """
+    return best_show_match(regex.finditer(file_name), 0, len(file_name))[0]
+
+
+def find_show_patterns(file_names: list[str], regex: re.Pattern) -> list[tuple]:
+    """ Finds the show pattern of many file names, in one pass over a newline delimited buffer.
+
+    Args:
+        file_names (list): The file names
+        regex (re.Pattern): A multiline pattern from compile_show_patterns
+
+    Returns: A (show, span) for each file name, in the same order; span is None if nothing was found
+    """
+    found = [('', None)] * len(file_names)
+    # The offsets of each name, and the matches in it
+    lines = list()
+    offset = 0
+    for file_name in file_names:
+        lines.append((offset, offset + len(file_name), list()))
+        offset += len(file_name) + 1
+    line = 0
+    for match in regex.finditer('\n'.join(file_names)):
+        # The matches come in order, so the line of each is found by moving forward from the last
+        while match.start() > lines[line][1]:
+            line += 1
+        lines[line][2].append(match)
+    for i, (start, end, matches) in enumerate(lines):
+        if matches:
+            found[i] = best_show_match(matches, start, end)
+    return found
+
+
+def get_folder_season(file_path: str) -> str:
+    """ The two digit Season # from the folders along the files directory, or '' """
     season = ''
-    episode = ''
     for f in os.path.split(os.path.dirname(file_path)):
-        s = re.findall(r'season (\d+)', f, re.IGNORECASE)
+        s = SEASON_FOLDER_REGEX.findall(f)
         if s:
             season = s[0] if isinstance(s, list) else s
             if len(season) == 1:
                 season = f'0{season}'
+    return season
+
+
+def parse_show_season_and_episode(show: str, season: str, file_name: str, episode_show: str = None):
+    """ Parses the Season # and Episode # from a show pattern, found by get_show_season_and_episode.
+
+    Args:
+        show (str): The show pattern found by the SEASON_EPISODE_PATTERNS
+        season (str): The Season # from the folders along the files directory
+        file_name (str): The file name
+        episode_show (str): The show pattern found by the EPISODE_PATTERNS; Searched for if needed, and not given
 
+    Returns: The show pattern, season and episode
+    """
+    episode = ''
     # Parse the Season # and Episode # from show
     if show:
         nums = [
             n if len(n) > 1 else f'0{n}'
-            for n in re.findall(r'\d+', show)
+            for n in NUMBER_REGEX.findall(show)
         ]
         if len(nums) == 3:
             return show, nums[0], f'{nums[1]}-{nums[2]}'
@@ -97,13 +203,13 @@ def get_show_season_and_episode(file_path: str) -> tuple[str, str, str]:
     # but a season was parsed from folders along the files directory:
     # Get show from EPISODE_PATTERNS
     if not show and season:
-        show = get_show_from_patterns(EPISODE_PATTERNS)
+        show = episode_show if episode_show is not None else find_show_pattern(file_name, EPISODE_REGEX)
 
     # Parse the Episode # from show
     if show:
         nums = [
             n if len(n) > 1 else f'0{n}'
-            for n in re.findall(r'\d+', show)
+            for n in NUMBER_REGEX.findall(show)
         ]
         if len(nums) == 2:
             return show, season, f'{nums[1]}-{nums[2]}'
@@ -113,6 +219,135 @@ def get_show_season_and_episode(file_path: str) -> tuple[str, str, str]:
     return show, season, episode
 
 
+@PARSE_CACHE.memoize
+def get_show_season_and_episode(file_path: str) -> tuple[str, str, str]:
+    file_name = os.path.basename(file_path)
+    show = find_show_pattern(file_name, SEASON_EPISODE_REGEX)
+    # Determine the Season # from folders along the files directory
+    season = get_folder_season(file_path)
+    return parse_show_season_and_episode(show, season, file_name)
+
+
+@dataclass
+class NameColumns:
+    """ The columnar results of classify_names, one row per file, in input order """
+    shows: list[str] = field(default_factory=list)
+    seasons: list[str] = field(default_factory=list)
+    episodes: list[str] = field(default_factory=list)
+    # The (start, end) of the show pattern in the file name, which get_file_title strips from the title
+    spans: list[tuple] = field(default_factory=list)
+    titles: list[str] = field(default_factory=list)
+
+    def rows(self):
+        """ The (show, season, episode, title) of each file """
+        return list(zip(self.shows, self.seasons, self.episodes, self.titles))
+
+
+def cached_row(file_path: str):
+    """ The (show, season, episode, title) of a file parsed before, from the PARSE_CACHE, or None """
+    parsed = PARSE_CACHE.get((get_show_season_and_episode.__name__, file_path))
+    if parsed is None:
+        return None
+    return (*parsed, get_file_title(os.path.basename(file_path), parsed[0]))
+
+
+def cache_row(file_path: str, row: tuple) -> tuple:
+    """ Keeps the parsed (show, season, episode) of a row in the PARSE_CACHE, as get_show_season_and_episode would """
+    PARSE_CACHE.put((get_show_season_and_episode.__name__, file_path), tuple(row[:3]))
+    return row
+
+
+def classify_names(file_paths: list[str]) -> NameColumns:
+    """ The batch equivalent of get_show_season_and_episode.
+
+        The files already in the PARSE_CACHE are taken from it. The names of the rest are joined into one
+        newline delimited buffer, and matched in a single multiline finditer pass, instead of one regex call per file.
+
+    Args:
+        file_paths (list): The paths to the files
+
+    Returns: The NameColumns, lined up with file_paths
+    """
+    rows = [cached_row(p) for p in file_paths]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    file_names = {i: os.path.basename(file_paths[i]) for i in missing}
+    found = dict()
+    # Names with a newline cannot go in the buffer; Those fall back to the single name pattern
+    buffered = [i for i in missing if '\n' not in file_names[i]]
+    for i, show in zip(buffered, find_show_patterns([file_names[i] for i in buffered], SEASON_EPISODE_LINES_REGEX)):
+        found[i] = show
+    for i in missing:
+        if i not in found:
+            found[i] = (find_show_pattern(file_names[i], SEASON_EPISODE_REGEX), None)
+    seasons = {i: get_folder_season(file_paths[i]) for i in missing}
+
+    # The EPISODE_PATTERNS are only needed by files without a show, in a Season folder
+    episode_found = dict()
+    fallback = [i for i in missing if not found[i][0] and seasons[i] and '\n' not in file_names[i]]
+    for i, show in zip(fallback, find_show_patterns([file_names[i] for i in fallback], EPISODE_LINES_REGEX)):
+        episode_found[i] = show
+
+    spans = dict()
+    for i in missing:
+        show, span = found[i]
+        episode_show, episode_span = episode_found.get(i, (None, None))
+        parsed = parse_show_season_and_episode(show, seasons[i], file_names[i], episode_show)
+        spans[i] = (span or episode_span) if parsed[0] else None
+        rows[i] = cache_row(file_paths[i], (*parsed, get_file_title(file_names[i], parsed[0])))
+
+    columns = NameColumns()
+    for i, (show, season, episode, title) in enumerate(rows):
+        columns.shows.append(show)
+        columns.seasons.append(season)
+        columns.episodes.append(episode)
+        columns.spans.append(spans.get(i))
+        columns.titles.append(title)
+    return columns
+
+
+def classify_chunk(file_paths: list[str]) -> list[tuple]:
+    """ The rows of classify_names; Plain tuples are cheap to send back from a worker process """
+    return classify_names(file_paths).rows()
+
+
+def iter_classified_chunks(chunks, workers: int = 0):
+    """ Classifies chunks of file paths, optionally in a process pool, yielding the results in the order of the chunks.
+        With workers, the files already in this process's PARSE_CACHE are not sent to them.
+
+    Args:
+        chunks (Iterable): (context, file_paths) for each chunk; The context is passed through untouched
+        workers (int): The number of worker processes; 0 classifies each chunk on the calling thread
+
+    Returns: A generator of (context, rows from classify_chunk)
+    """
+    if not workers:
+        for context, file_paths in chunks:
+            yield context, classify_chunk(file_paths)
+        return None
+
+    # Imported here, as multiprocessing is slow to import, and only needed with workers
+    from concurrent.futures import ProcessPoolExecutor
+
+    def result(file_paths, rows, future):
+        parsed = iter(future.result() if future else ())
+        return [row or cache_row(path, next(parsed)) for path, row in zip(file_paths, rows)]
+
+    # Keeps a couple of chunks in flight per worker, while the chunks are still being produced
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for context, file_paths in chunks:
+            rows = [cached_row(p) for p in file_paths]
+            missing = [p for p, row in zip(file_paths, rows) if row is None]
+            pending.append((context, file_paths, rows, pool.submit(classify_chunk, missing) if missing else None))
+            while len(pending) > workers * 2:
+                context, *chunk = pending.popleft()
+                yield context, result(*chunk)
+        while pending:
+            context, *chunk = pending.popleft()
+            yield context, result(*chunk)
+
+
+@PARSE_CACHE.memoize
 def get_file_title(file_name: str, show: str) -> str:
     if show:
         title = file_name.replace(show, '')
@@ -123,6 +358,7 @@ def get_file_title(file_name: str, show: str) -> str:
     return title
 
 
+@PARSE_CACHE.memoize
 def tv_show_ep_from_file_name(file_name):
     """ Finds the pattern of the TV Show, and number for the season and episode based on the pattern.
 
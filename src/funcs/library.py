@@ -0,0 +1,160 @@
+import os
+import threading
+
+
+class LibraryIndex:
+    """
+        In-memory listing of the destination folders in the media folder.
+
+        The "TV Shows/<title>/Season N" and "Movies" folders are listed once with os.scandir,
+        so the existence and collision checks of an organize run are answered from memory,
+        instead of with a round trip to the media folder for each file.
+        All lookups are case-insensitive, the same as the media folder on Windows or an SMB share.
+    """
+
+    def __init__(self, media_path):
+        """
+        Args:
+            media_path (str): The media folder, containing the "Movies" and "TV Shows" folders
+        """
+        self.media_path = media_path
+        # {lowercased path: path} of the folders known to exist
+        self.__folders = dict()
+        # {lowercased path: {lowercased name: name}} of the files in each listed folder
+        self.__files = dict()
+        self.__lock = threading.Lock()
+        self.__built = threading.Event()
+        # The error that stopped the build, raised again by wait()
+        self.__error = None
+
+    def build(self, show_titles=None):
+        """ Lists the Movies folder, and the season folders of the given shows
+
+        Args:
+            show_titles (set): The titles of the shows to list; All of them if None
+        """
+        wanted = {t.lower() for t in show_titles} if show_titles is not None else None
+        try:
+            self.__list(self.media_path)
+            self.__list(os.path.join(self.media_path, 'Movies'))
+            for show in self.__list(os.path.join(self.media_path, 'TV Shows')):
+                if wanted is None or os.path.basename(show).lower() in wanted:
+                    for season in self.__list(show):
+                        self.__list(season)
+        except BaseException as e:
+            self.__error = e
+            raise
+        finally:
+            # Set even if the build failed, so wait() never blocks forever
+            self.__built.set()
+
+    def build_in_background(self, show_titles=None):
+        """ Builds the index on a daemon thread, while the user is still reviewing their media """
+        thread = threading.Thread(target=self.__build_quietly, args=(show_titles,), daemon=True)
+        thread.start()
+        return thread
+
+    def __build_quietly(self, show_titles):
+        try:
+            self.build(show_titles)
+        except Exception:
+            # Raised from wait(), on the thread that uses the index
+            pass
+
+    def wait(self):
+        """ Blocks until the index has been built, raising the error that stopped the build if it failed """
+        self.__built.wait()
+        if self.__error is not None:
+            raise self.__error
+
+    def __list(self, folder):
+        """ Records the files and folders in a folder
+
+        Returns: The paths of the folders in the folder
+        """
+        folder = self.resolve(folder)
+        try:
+            with os.scandir(folder) as it:
+                entries = list(it)
+        except OSError:
+            return []
+        sub_folders = list()
+        with self.__lock:
+            self.__folders[folder.lower()] = folder
+            files = self.__files.setdefault(folder.lower(), dict())
+            for entry in entries:
+                if entry.is_dir():
+                    self.__folders[entry.path.lower()] = entry.path
+                    sub_folders.append(entry.path)
+                else:
+                    files[entry.name.lower()] = entry.name
+        return sub_folders
+
+    def __is_missing(self, path):
+        """ Whether the path is known not to exist, because a listed folder above it does not contain it """
+        parent = os.path.dirname(path)
+        while parent and parent != path:
+            files = self.__files.get(parent.lower())
+            if files is not None:
+                return path.lower() not in self.__folders and os.path.basename(path).lower() not in files
+            path, parent = parent, os.path.dirname(parent)
+        return False
+
+    def resolve(self, folder):
+        """ The folder, with the casing of the existing folders it matches; "the office/Season 1" -> "The Office/Season 1" """
+        tail = list()
+        parent = folder
+        while parent.lower() not in self.__folders:
+            parent, name = os.path.split(parent)
+            if not name:
+                return folder
+            tail.insert(0, name)
+        return os.path.join(self.__folders[parent.lower()], *tail)
+
+    def folder_exists(self, folder):
+        if folder.lower() in self.__folders:
+            return True
+        if self.__is_missing(folder):
+            return False
+        return os.path.isdir(folder)
+
+    def find(self, path):
+        """ The path of the file at the path, with its existing casing, or None if there is no such file """
+        folder, name = os.path.split(path)
+        files = self.__files.get(folder.lower())
+        if files is not None:
+            name = files.get(name.lower())
+            return os.path.join(self.resolve(folder), name) if name else None
+        if self.__is_missing(folder):
+            return None
+        return path if os.path.exists(path) else None
+
+    def exists(self, path):
+        """ Whether a file exists at the path, ignoring case """
+        return self.find(path) is not None
+
+    def makedirs(self, folder):
+        """ Creates the folder, unless it is known to exist """
+        if folder.lower() in self.__folders:
+            return None
+        os.makedirs(folder, exist_ok=True)
+        with self.__lock:
+            # Only the folders under the media folder were created empty, and are known to be empty
+            root = os.path.join(self.media_path, '').lower()
+            while folder.lower().startswith(root) and folder.lower() not in self.__folders:
+                self.__folders[folder.lower()] = folder
+                self.__files.setdefault(folder.lower(), dict())
+                folder = os.path.dirname(folder)
+
+    def add(self, path):
+        """ Records a file that was moved into the library """
+        folder, name = os.path.split(path)
+        with self.__lock:
+            if folder.lower() in self.__files:
+                self.__files[folder.lower()][name.lower()] = name
+
+    def remove(self, path):
+        """ Records a file that was moved or renamed out of its place in the library """
+        folder, name = os.path.split(path)
+        with self.__lock:
+            self.__files.get(folder.lower(), dict()).pop(name.lower(), None)
@@ -0,0 +1,301 @@
+import os
+import re
+from bisect import insort
+from functools import lru_cache
+from pathlib import Path
+
+DIGITS = re.compile(r'(\d+)')
+
+
+def natural_key(text: str) -> tuple:
+    """ A sort key that orders the numbers in a text by value; "Episode 2" sorts before "Episode 10" """
+    # re.split with a group alternates text and digits, so the parts of two keys always compare like with like
+    parts = DIGITS.split(text.lower()) if text else ['']
+    parts[1::2] = map(int, parts[1::2])
+    return tuple(parts)
+
+
+class TreeNode:
+    """ A node of a MediaTree; A header, a group of nodes, or a single item """
+    __slots__ = ('id', 'text', 'key', 'tooltip', 'depth', 'parent', 'children', 'pending', 'expanded', 'header',
+                 'selected', 'total', 'metadata', 'on_toggle_off', 'on_toggle_on')
+
+    def __init__(self, text, depth=0, parent=None, tooltip=None, header=False,
+                 metadata=None, on_toggle_off=None, on_toggle_on=None, id=None):
+        # The item's index in the MediaTree's selection; None for groups
+        self.id = id
+        self.text = text
+        # Computed once, so sorting the node's siblings never parses its text again
+        self.key = natural_key(text)
+        self.tooltip = tooltip
+        self.depth = depth
+        self.parent = parent
+        # None for items, which have no children
+        self.children = None
+        # The children added while the group was collapsed, which are sorted into children when it is expanded
+        self.pending = None
+        self.expanded = False
+        self.header = header
+        # The number of selected items under a group, and the number of items under it;
+        # Items keep their selection in the MediaTree
+        self.selected = 0
+        self.total = 0
+        self.metadata = metadata
+        self.on_toggle_off = on_toggle_off
+        self.on_toggle_on = on_toggle_on
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+    def iter_items(self):
+        """ Yields the items under the node """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.children is None:
+                yield node
+            else:
+                stack.extend(node.children)
+                if node.pending:
+                    stack.extend(node.pending)
+
+
+@lru_cache(maxsize=4096)
+def review_folder(origin_dir):
+    """ Reduces the display of a folder path to the last two folders, maximum; Cached, as many files share a folder """
+    return os.path.join(*Path(origin_dir).parts[-2:])
+
+
+def review_keys(title, media_file):
+    """ The groups of a media file in the review window; (folder, kind, title, season) or (folder, kind)
+
+    Args:
+        title (str): The title of the file's container
+        media_file (MediaFile):
+    """
+    folder = review_folder(media_file.origin_dir)
+    kind = f'{media_file.type}s'
+    if kind == 'TV Shows':
+        return folder, kind, title, f'Season {media_file.season}'
+    return folder, kind
+
+
+class MediaTree:
+    """
+        The media files being reviewed, grouped and sorted, without any Tk widgets.
+
+        The groups and items of each node are kept in natural order by their keys, which are computed once per node.
+        Items are added in batches; Each node that was added to is sorted once per batch, which is close to linear
+        as its existing children are already sorted.
+        Groups below the headers and kinds start collapsed, and the children added to a collapsed group are only
+        sorted into it when it is first expanded, so the first render lists the groups rather than every file.
+
+        The selection is a bytearray indexed by item id, rather than a flag on each MediaFile or widget.
+        Each group counts its selected items, so its tri-state is known without visiting its subtree,
+        and a bulk toggle only visits the items under the toggled node.
+    """
+
+    def __init__(self, items_dict=None, open_depth=2):
+        """
+        Args:
+            items_dict (dict): {header: {name: {name: [item, ...]}}}; See add_items
+            open_depth (int): The number of levels of groups that start expanded; The headers and kinds by default
+        """
+        self.open_depth = open_depth
+        self.root = TreeNode('', depth=-1)
+        self.root.children = list()
+        self.root.expanded = True
+        # {(keys, ...): TreeNode} of the nodes with children
+        self.__nodes = {(): self.root}
+        # 1 if the item of that id is selected, else 0; The items and their file paths, by id
+        self.selection = bytearray()
+        self.__items = list()
+        self.__paths = list()
+        # {file path: id}
+        self.__ids = dict()
+        if items_dict:
+            self.add_items(items_dict)
+
+    def __len__(self):
+        return self.root.total
+
+    def node(self, keys):
+        """ The group at the keys, or None """
+        return self.__nodes.get(tuple(keys))
+
+    def __group(self, keys, added):
+        node = self.__nodes.get(keys)
+        if node is None:
+            parent = self.__group(keys[:-1], added)
+            node = TreeNode(keys[-1], parent.depth + 1, parent, header=len(keys) == 1)
+            node.children = list()
+            node.expanded = len(keys) <= self.open_depth
+            added.setdefault(parent, list()).append(node)
+            self.__nodes[keys] = node
+        return node
+
+    def add(self, entries):
+        """ Adds a batch of items
+
+        Args:
+            entries (iterable): (keys, text, path, metadata, on_toggle_off, on_toggle_on, selected) of each item;
+                                The file path is shown as the item's tooltip, and may be None
+
+        Returns: The new item nodes
+        """
+        # {group: [new children]}, and {group: [selected, total]} of the items added to each group
+        added = dict()
+        counts = dict()
+        leaves = list()
+        for keys, text, path, metadata, on_toggle_off, on_toggle_on, selected in entries:
+            node = self.__nodes.get(keys) or self.__group(tuple(keys), added)
+            leaf = TreeNode(text, node.depth + 1, node, tooltip=path, metadata=metadata,
+                            on_toggle_off=on_toggle_off, on_toggle_on=on_toggle_on, id=len(self.__items))
+            self.selection.append(1 if selected else 0)
+            self.__items.append(leaf)
+            self.__paths.append(path)
+            if path is not None:
+                self.__ids[path] = leaf.id
+            added.setdefault(node, list()).append(leaf)
+            count = counts.get(node)
+            if count is None:
+                count = counts[node] = [0, 0]
+            count[0] += self.selection[leaf.id]
+            count[1] += 1
+            leaves.append(leaf)
+        for node, new in added.items():
+            if node.expanded:
+                self.__merge(node, new)
+            elif node.pending is None:
+                node.pending = new
+            else:
+                node.pending.extend(new)
+        # Each group passes its counts up once per batch, rather than once per item
+        for node, (selected, total) in counts.items():
+            while node is not None:
+                node.selected += selected
+                node.total += total
+                node = node.parent
+        return leaves
+
+    @staticmethod
+    def __merge(node, new):
+        """ Sorts new children into a group's sorted children """
+        if len(new) > len(node.children):
+            # Sorted once, when the batch outweighs the group's sorted children
+            node.children.extend(new)
+            node.children.sort(key=lambda n: n.key)
+        else:
+            for child in new:
+                insort(node.children, child)
+
+    def set_expanded(self, node, expanded=True):
+        """ Expands or collapses a group, sorting the children added while it was collapsed into it """
+        if expanded and node.pending:
+            self.__merge(node, node.pending)
+            node.pending = None
+        node.expanded = expanded
+
+    def add_files(self, files, selected=None):
+        """ Adds a batch of media files, grouped as in the review window.
+            Their selection is kept by the tree; See selected_paths
+
+        Args:
+            files (list): (container title, media file) pairs
+            selected (set): The paths of the files that start selected; None to use MediaFile.selected
+        """
+        return self.add(
+            (review_keys(title, file), file.file_rename, file.path, file, None, None,
+             file.selected if selected is None else file.path in selected)
+            for title, file in files
+        )
+
+    def add_items(self, items_dict):
+        """ Adds the items of a dictionary, as given to CheckBoxes
+
+        Args:
+            items_dict (dict): {header: {name: [item, ...]}}, nested to any depth;
+                               Each item is a dict of file_rename, file_path, on_toggle_off, on_toggle_on and selected
+        """
+        def entries(value, keys):
+            if isinstance(value, dict):
+                for k, v in value.items():
+                    yield from entries(v, keys + (k,))
+                return None
+            for item in value:
+                on_toggle_off = item.pop('on_toggle_off', None)
+                on_toggle_on = item.pop('on_toggle_on', None)
+                metadata = item if on_toggle_off and on_toggle_on else None
+                yield (keys, item.get('file_rename'), item.get('file_path'), metadata,
+                       on_toggle_off, on_toggle_on, item.get('selected') is not False)
+
+        return self.add(entries(items_dict, ()))
+
+    def count(self, node):
+        """ The number of selected items under the node, and the number of items under it """
+        if node.id is not None:
+            return self.selection[node.id], 1
+        return node.selected, node.total
+
+    def state(self, node):
+        """ "all", "none" or "some" of the items under the node are selected """
+        selected, total = self.count(node)
+        if selected == total:
+            return 'all'
+        return 'none' if not selected else 'some'
+
+    def toggle(self, node):
+        """ Selects every item under the node, or deselects them if they are all selected already
+
+        Returns: True if the items were selected
+        """
+        select = self.state(node) != 'all'
+        self.set_selected(node.iter_items(), select)
+        return select
+
+    def set_selected(self, items, select):
+        """ Selects or deselects items, calling their toggle functions
+
+        Args:
+            items (iterable): The item nodes
+            select (bool): True to select the items
+        """
+        value = 1 if select else 0
+        # {group: change} of the selected counts, passed up once per group
+        changes = dict()
+        for item in items:
+            if self.selection[item.id] == value:
+                continue
+            self.selection[item.id] = value
+            changes[item.parent] = changes.get(item.parent, 0) + (1 if select else -1)
+            callback = item.on_toggle_on if select else item.on_toggle_off
+            if callback:
+                callback(item.metadata)
+        for node, change in changes.items():
+            while node is not None:
+                node.selected += change
+                node = node.parent
+
+    def select_paths(self, paths, select=True):
+        """ Selects or deselects the items of file paths; Paths that are not in the tree are ignored """
+        ids = (self.__ids.get(path) for path in paths)
+        self.set_selected((self.__items[i] for i in ids if i is not None), select)
+
+    def is_selected(self, path):
+        i = self.__ids.get(path)
+        return i is not None and bool(self.selection[i])
+
+    def selected_paths(self):
+        """ The set of file paths of the selected items """
+        return {path for path, selected in zip(self.__paths, self.selection) if selected and path is not None}
+
+    def rows(self):
+        """ The nodes in view, in order; The children of collapsed nodes are left out """
+        rows = list()
+        stack = list(reversed(self.root.children))
+        while stack:
+            node = stack.pop()
+            rows.append(node)
+            if node.children is not None and node.expanded:
+                stack.extend(reversed(node.children))
+        return rows
@@ -0,0 +1,150 @@
+import os
+import json
+import threading
+import functools
+from collections import OrderedDict
+
+
+class ParseCache:
+    """
+        A size-bounded LRU cache, shared by the file name parsing functions.
+
+        Functions are registered with the memoize decorator, and their results are keyed by
+        (function name, *args), so one bound applies to all of them.
+        The least recently used results are evicted once the cache is full.
+    """
+
+    def __init__(self, maxsize=100000):
+        """
+        Args:
+            maxsize (int): The maximum number of results to keep
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+        self.__functions = dict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def memoize(self, func):
+        """ Decorates a function of hashable positional arguments, caching its results """
+        name = func.__name__
+        self.__functions[name] = func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, *args)
+            try:
+                with self.__lock:
+                    result = self.__entries[key]
+                    self.__entries.move_to_end(key)
+                    self.hits += 1
+                return result
+            except (KeyError, TypeError):
+                # TypeError: The arguments are unhashable, and cannot be cached
+                pass
+            result = func(*args, **kwargs)
+            if not kwargs:
+                self.put(key, result)
+            return result
+
+        return wrapper
+
+    def get(self, key, default=None):
+        """ The cached result of a (function name, *args) key, or the default """
+        with self.__lock:
+            if key not in self.__entries:
+                return default
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return self.__entries[key]
+
+    def put(self, key, result):
+        try:
+            with self.__lock:
+                self.misses += 1
+                self.__entries[key] = result
+                self.__entries.move_to_end(key)
+                self.__evict(len(self.__entries) - self.maxsize)
+        except TypeError:
+            pass
+
+    def evict(self, count):
+        """ Evicts the <count> least recently used results """
+        with self.__lock:
+            self.__evict(count)
+
+    def __evict(self, count):
+        for _ in range(min(count, len(self.__entries))):
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        self.evict(len(self.__entries) - maxsize)
+
+    def clear(self):
+        """ Empties the cache and resets the counters """
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        """ The hit/miss counters, and the size of the cache """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self.__entries),
+            'maxsize': self.maxsize,
+        }
+
+    def save(self, path, version=None):
+        """ Saves the cached results with string arguments, least recently used first, to a json file
+
+        Args:
+            path (str): The path to the file
+            version (int): The version of the functions that computed the results; See load
+        """
+        with self.__lock:
+            entries = [
+                [key[0], list(key[1:]), result]
+                for key, result in self.__entries.items()
+                if all(isinstance(arg, str) for arg in key[1:])
+            ]
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump({'version': version, 'entries': entries}, file, separators=(',', ':'))
+
+    def load(self, path, version=None):
+        """ Loads the results saved by a previous run, for the registered functions
+
+        Args:
+            path (str): The path to the file
+            version (int): The version of the functions; Results saved by another version are not loaded
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(saved, dict) or saved.get('version') != version:
+            return None
+        with self.__lock:
+            for name, args, result in saved['entries']:
+                if name not in self.__functions:
+                    continue
+                # json saves the tuples returned by the parsers as lists
+                self.__entries[(name, *args)] = tuple(result) if isinstance(result, list) else result
+            self.__evict(len(self.__entries) - self.maxsize)
+
+
+PARSE_CACHE = ParseCache()
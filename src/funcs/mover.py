@@ -0,0 +1,345 @@
+import os
+import sys
+import errno
+import shutil
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from itertools import chain, zip_longest
+from concurrent.futures import ThreadPoolExecutor
+
+
+def get_device(path):
+    """ The st_dev of the path, or of its nearest existing parent folder """
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+@functools.lru_cache(maxsize=None)
+def _renameat2():
+    """ The renameat2 function of Linux's libc, or None """
+    if not sys.platform.startswith('linux'):
+        return None
+    import ctypes
+    import ctypes.util
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        renameat2 = libc.renameat2
+    except (OSError, AttributeError):
+        # glibc before 2.28
+        return None
+    renameat2.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+    return renameat2
+
+
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+
+
+def rename_no_replace(source, destination):
+    """ Renames a file, failing with FileExistsError rather than replacing a file already at the destination.
+
+        The library may have changed since it was listed, such as by a file that arrived from another organize run,
+        so the check is made by the rename itself: renameat2 with RENAME_NOREPLACE on Linux, os.rename on Windows,
+        where it never replaces, and elsewhere a hard link at the destination, after which the source is unlinked.
+        Only on filesystems with none of those is the destination checked right before the rename.
+    """
+    renameat2 = _renameat2()
+    if renameat2 is not None:
+        if renameat2(AT_FDCWD, os.fsencode(source), AT_FDCWD, os.fsencode(destination), RENAME_NOREPLACE) == 0:
+            return None
+        import ctypes
+        e = ctypes.get_errno()
+        # EEXIST makes a FileExistsError; ENOSYS and EINVAL if the kernel or filesystem lacks the flag
+        if e not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise OSError(e, os.strerror(e), destination)
+    if os.name == 'nt':
+        return os.rename(source, destination)
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        raise
+    except OSError:
+        if os.path.lexists(destination):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), destination)
+        return os.rename(source, destination)
+    os.unlink(source)
+
+
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# The errors of the kernel copy functions, when they cannot copy between the two files;
+# sendfile fails with ENOTSOCK on macOS, where it only sends to sockets
+UNSUPPORTED_COPY_ERRORS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP, errno.ENOTSOCK
+}
+
+
+def copy_file_data(source_fd, destination_fd, size, chunk_size=COPY_CHUNK_SIZE, on_progress=None):
+    """ Copies the data of one file to another, in the kernel where possible.
+
+        Uses os.copy_file_range, then os.sendfile, and then plain reads and writes,
+        as each is unsupported by the platform or the pair of filesystems.
+
+    Args:
+        source_fd (int): The file descriptor to copy from
+        destination_fd (int): The file descriptor to copy to
+        size (int): The number of bytes to copy
+        chunk_size (int): The maximum number of bytes to copy at once
+        on_progress (function): Called with the number of bytes copied, after each chunk
+
+    Returns: The number of bytes copied
+    """
+    copied = 0
+    for copy in (getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)):
+        if copy is None:
+            continue
+        try:
+            while copied < size:
+                if copy is os.sendfile:
+                    sent = os.sendfile(destination_fd, source_fd, copied, min(chunk_size, size - copied))
+                else:
+                    sent = os.copy_file_range(source_fd, destination_fd, min(chunk_size, size - copied))
+                if not sent:
+                    break
+                copied += sent
+                if on_progress:
+                    on_progress(copied)
+            if copied >= size:
+                return copied
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_COPY_ERRORS or copied:
+                raise
+    buffer = bytearray(min(chunk_size, max(size, 1)))
+    os.lseek(source_fd, copied, os.SEEK_SET)
+    with open(source_fd, 'rb', buffering=0, closefd=False) as src, \
+            open(destination_fd, 'wb', buffering=0, closefd=False) as dst:
+        while True:
+            read = src.readinto(buffer)
+            if not read:
+                break
+            dst.write(memoryview(buffer)[:read])
+            copied += read
+            if on_progress:
+                on_progress(copied)
+    return copied
+
+
+def file_checksum(path, chunk_size=COPY_CHUNK_SIZE):
+    """ The blake2b digest of a file's data """
+    digest = hashlib.blake2b()
+    buffer = bytearray(min(chunk_size, 1024 * 1024))
+    with open(path, 'rb', buffering=0) as file:
+        while True:
+            read = file.readinto(buffer)
+            if not read:
+                break
+            digest.update(memoryview(buffer)[:read])
+    return digest.hexdigest()
+
+
+def copy_file(source, destination, verify='size', chunk_size=COPY_CHUNK_SIZE, on_progress=None):
+    """ Copies a file to another filesystem, without ever leaving a partial file under its final name.
+
+        The data is written to a hidden temporary file beside the destination, preallocated to its full size,
+        and synced to disk before it is renamed into place.
+
+    Args:
+        source (str): The path to the file
+        destination (str): The path to copy the file to
+        verify (str): "size" or "checksum" to check the copy before it is renamed into place; None to skip
+        chunk_size (int): The maximum number of bytes to copy at once
+        on_progress (function): Called with the number of bytes copied, after each chunk
+    """
+    folder, name = os.path.split(destination)
+    temp_path = os.path.join(folder, f'.{name}.partial')
+    try:
+        with open(source, 'rb') as src, open(temp_path, 'wb') as dst:
+            size = os.fstat(src.fileno()).st_size
+            if size and hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(dst.fileno(), 0, size)
+                except OSError:
+                    # Not every filesystem can preallocate
+                    pass
+            copied = copy_file_data(src.fileno(), dst.fileno(), size, chunk_size, on_progress)
+            # Drop any preallocated space past the end of the copied data
+            dst.truncate(copied)
+            os.fsync(dst.fileno())
+        shutil.copystat(source, temp_path)
+        if verify and os.stat(temp_path).st_size != size:
+            raise OSError(errno.EIO, f'Copied {copied} of {size} bytes', destination)
+        if verify == 'checksum' and file_checksum(source, chunk_size) != file_checksum(temp_path, chunk_size):
+            raise OSError(errno.EIO, 'The copied data does not match the original', destination)
+        rename_no_replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def sync_folders(folders):
+    """ Syncs the entries of each folder to disk, once, so renamed files survive a crash """
+    if not hasattr(os, 'O_DIRECTORY'):
+        # Folders cannot be opened on Windows, where renames are already durable
+        return None
+    for folder in set(folders):
+        try:
+            fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            continue
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def move_file(source, destination, same_device=None, on_progress=None, verify='size', chunk_size=COPY_CHUNK_SIZE):
+    """ Moves a file to its destination, under its final name.
+
+        Files on the same filesystem are moved with a single rename,
+        while files on other filesystems are copied by copy_file, and removed once the copy is synced to disk.
+        A file already at the destination is never replaced; FileExistsError is raised instead.
+
+    Args:
+        source (str): The path to the file
+        destination (str): The path to move the file to
+        same_device (bool): Whether the source and destination are on the same filesystem; Checked if None
+        on_progress (function): Called with the number of bytes copied, when copying to another filesystem
+        verify (str): "size" or "checksum" to check a copy before the source is removed; None to skip
+        chunk_size (int): The maximum number of bytes to copy at once
+    """
+    if same_device is None:
+        same_device = get_device(source) == get_device(os.path.dirname(destination))
+    if same_device:
+        try:
+            return rename_no_replace(source, destination)
+        except FileExistsError:
+            raise
+        except OSError:
+            # Some network shares report a single device, but cannot rename across their own shares
+            pass
+    copy_file(source, destination, verify, chunk_size, on_progress)
+    # The copy's name is synced before the original is removed, so a crash cannot lose both
+    sync_folders([os.path.dirname(destination)])
+    os.remove(source)
+
+
+class MoveScheduler:
+    """
+        Runs file moves concurrently, grouped by their (source device, destination device) pair.
+
+        Moves between independent pairs of devices run at the same time,
+        while each device is used by at most <streams_per_device> moves at once,
+        so that a spinning disk is never thrashed by interleaved reads and writes.
+    """
+
+    def __init__(self, streams_per_device=1, verify='size', chunk_size=COPY_CHUNK_SIZE):
+        """
+        Args:
+            streams_per_device (int): The maximum number of moves that read from, or write to, a device at once
+            verify (str): "size" or "checksum" to check each copy to another device; None to skip
+            chunk_size (int): The maximum number of bytes to copy at once
+        """
+        self.streams_per_device = max(1, streams_per_device)
+        self.verify = verify
+        self.chunk_size = chunk_size
+        self.__devices = dict()
+        self.__lock = threading.Lock()
+
+    def __device(self, path):
+        """ The device of a path, cached by its folder """
+        folder = os.path.dirname(path)
+        if folder not in self.__devices:
+            self.__devices[folder] = get_device(folder)
+        return self.__devices[folder]
+
+    def is_same_device(self, source, destination):
+        """ Whether a move is a rename within one filesystem, rather than a copy to another """
+        device = self.__device(source)
+        return device is not None and device == self.__device(destination)
+
+    def group(self, moves):
+        """ Groups moves by their (source device, destination device) pair
+
+        Args:
+            moves (list): (source, destination, context) tuples
+
+        Returns: An OrderedDict of {(source device, destination device): [(source, destination, context)]}
+        """
+        groups = OrderedDict()
+        for source, destination, context in moves:
+            pair = (self.__device(source), self.__device(destination))
+            groups.setdefault(pair, list()).append((source, destination, context))
+        return groups
+
+    def run(self, moves, on_done=None, on_progress=None, move=None):
+        """ Runs the moves, and blocks until they are all done
+
+        Args:
+            moves (list): (source, destination, context) tuples
+            on_done (function): Called with (source, destination, context, error) after each move,
+                                one at a time; error is None if the move succeeded.
+                                A move whose on_done raises is failed with that error
+            on_progress (function): Called with (source, destination, context, bytes copied) while a file is
+                                    copied to another device
+            move (function): Moves a file; Called with (source, destination, same_device, on_progress).
+                             Defaults to move_file
+
+        Returns: A list of the (source, destination, context, error) of the moves that failed
+        """
+        if move is None:
+            move = functools.partial(move_file, verify=self.verify, chunk_size=self.chunk_size)
+        groups = self.group(moves)
+        devices = {device for pair in groups for device in pair}
+        semaphores = {device: threading.Semaphore(self.streams_per_device) for device in devices}
+        failed = list()
+
+        def run_move(pair, source, destination, context):
+            # Acquire the devices in a fixed order, so two pairs never wait on each other
+            held = [semaphores[device] for device in sorted(set(pair), key=str)]
+            for semaphore in held:
+                semaphore.acquire()
+            error = None
+            progress = None
+            if on_progress:
+                def progress(copied):
+                    on_progress(source, destination, context, copied)
+            try:
+                move(source, destination, pair[0] == pair[1] and pair[0] is not None, progress)
+            except Exception as e:
+                # Any error fails the move, as nothing checks the results of the executor's futures
+                error = e
+            finally:
+                for semaphore in reversed(held):
+                    semaphore.release()
+            with self.__lock:
+                if error is not None:
+                    failed.append((source, destination, context, error))
+                if on_done:
+                    try:
+                        on_done(source, destination, context, error)
+                    except Exception as e:
+                        # The move is not done until on_done has recorded it, such as in a journal
+                        if error is None:
+                            failed.append((source, destination, context, e))
+
+        # Interleave the groups, so that every pair of devices starts moving right away
+        queues = [[(pair, *m) for m in group] for pair, group in groups.items()]
+        ordered = [task for task in chain.from_iterable(zip_longest(*queues)) if task is not None]
+        workers = max(1, len(devices) * self.streams_per_device)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for task in ordered:
+                executor.submit(run_move, *task)
+        # Sync each destination folder once, rather than after every file
+        sync_folders(os.path.dirname(destination) for source, destination, context in moves)
+        return failed
+
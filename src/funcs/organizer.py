@@ -0,0 +1,314 @@
+import os
+import json
+import shutil
+from dataclasses import dataclass, field
+
+from src.funcs.mover import move_file, rename_no_replace
+from src.funcs.completeness import PARTIAL_SUFFIXES
+
+
+@dataclass
+class OrganizeStep:
+    """ A single file operation of an organize run """
+    # "move" a file into the library, "rename" a file already in the library, or "skip" a file
+    kind: str
+    source: str
+    destination: str
+    media_file: object = field(default=None, repr=False, compare=False)
+
+    def to_list(self):
+        return [self.kind, self.source, self.destination]
+
+
+@dataclass
+class OrganizePlan:
+    """ Everything an organize run will do, decided before any file is touched """
+    steps: list = field(default_factory=list)
+    # The folders to create in the library, without duplicates
+    folders: set = field(default_factory=set)
+    # {lowercased destination: [sources]} of the files that would be organized to the same path
+    conflicts: dict = field(default_factory=dict)
+    # The download folders to delete, once their files have been moved
+    folders_to_delete: list = field(default_factory=list)
+    # Whether the plan is that of an interrupted run, and the indexes of the steps that run completed
+    resumed: bool = False
+    completed: set = field(default_factory=set)
+
+    def __len__(self):
+        return len(self.steps)
+
+
+def folders_of(paths):
+    """ The folders holding the paths, and every folder above them """
+    folders = set()
+    for path in paths:
+        folder = os.path.dirname(path)
+        # A folder already in the set has its parents in it too
+        while folder not in folders and folder != os.path.dirname(folder):
+            folders.add(folder)
+            folder = os.path.dirname(folder)
+    return folders
+
+
+def plan_organize(media_containers, media_path, downloads_path, library, selected=None, kept=()):
+    """ Decides where each selected media file is organized to, without touching the file system
+
+    Args:
+        media_containers (MediaContainers): The grouped media files
+        media_path (str): The media folder, containing the "Movies" and "TV Shows" folders
+        downloads_path (str): The downloads folder, which is never deleted
+        library (LibraryIndex): The destination folders and files that already exist
+        selected (set): The paths of the files to organize, as read from a MediaTree; None to use MediaFile.selected
+        kept (iterable): The paths of other files that stay in the downloads, such as the downloads that are not
+                         finished; The folders holding them, or holding files that are not selected, are not deleted
+
+    Returns: An OrganizePlan
+    """
+    plan = OrganizePlan()
+    # {lowercased destination: source} of the files already planned, to find conflicts within the run
+    targets = dict()
+    folders_to_delete = dict()
+    staying = list(kept)
+    for container in media_containers:
+        for media_file in container.media_files:
+            if not (media_file.selected if selected is None else media_file.path in selected):
+                # Files moved by an interrupted run are left out of the selection too, but are no longer there
+                if os.path.lexists(media_file.path):
+                    staying.append(media_file.path)
+                continue
+            path = os.path.dirname(media_file.path)
+            # Route for TV Shows
+            if media_file.type == 'TV Show':
+                season_folder = f'Season {media_file.season}'
+                output_folder = os.path.join(media_path, 'TV Shows', container.title, season_folder)
+            # Route for Movies
+            else:
+                output_folder = os.path.join(media_path, 'Movies')
+            # Use the casing of an existing folder, rather than creating a second one beside it
+            output_folder = library.resolve(output_folder)
+            output_path = os.path.join(output_folder, media_file.file_name)
+            renamed_file_path = os.path.join(output_folder, media_file.file_rename)
+            plan.folders.add(output_folder)
+
+            key = renamed_file_path.lower()
+            if key in targets:
+                plan.conflicts.setdefault(key, [targets[key]]).append(media_file.path)
+                step = OrganizeStep('skip', media_file.path, renamed_file_path, media_file)
+            elif not library.exists(output_path) and not library.exists(renamed_file_path):
+                step = OrganizeStep('move', media_file.path, renamed_file_path, media_file)
+            elif not library.exists(renamed_file_path):
+                step = OrganizeStep('rename', library.find(output_path), renamed_file_path, media_file)
+            else:
+                step = OrganizeStep('skip', media_file.path, renamed_file_path, media_file)
+            if step.kind != 'skip':
+                targets[key] = media_file.path
+            else:
+                staying.append(media_file.path)
+            plan.steps.append(step)
+            # Add the moved file's folder path to the list of folders to delete
+            if path != downloads_path and path != media_path and path != output_folder and step.kind != 'skip':
+                folders_to_delete[path] = True
+    staying = folders_of(staying)
+    plan.folders_to_delete = [folder for folder in folders_to_delete if folder not in staying]
+    return plan
+
+
+class OrganizeJournal:
+    """
+        An append-only record of an organize run, so it can be resumed after a crash, or undone.
+
+        The first line holds the steps of the plan, and each following line the index of a completed step;
+        {"steps": [[kind, source, destination], ...], "folders_to_delete": [...]}, {"done": 3}, ..., {"finished": true}
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The path to the journal file
+        """
+        self.path = path
+        self.__file = None
+
+    def start(self, plan):
+        """ Starts a new journal for the plan, replacing the journal of the previous run """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.__file = open(self.path, 'w')
+        self.__write({
+            'steps': [step.to_list() for step in plan.steps],
+            'folders_to_delete': plan.folders_to_delete,
+        })
+
+    def __write(self, entry):
+        self.__file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+    def resume(self):
+        """ Continues the journal of an interrupted run, after its last complete line """
+        with open(self.path, 'rb+') as file:
+            file.truncate(file.read().rfind(b'\n') + 1)
+        self.__file = open(self.path, 'a')
+
+    def record(self, index):
+        """ Records that the step at the index is done """
+        self.__write({'done': index})
+
+    def finish(self):
+        self.__write({'finished': True})
+        self.__file.close()
+        self.__file = None
+
+    def read(self):
+        """ The steps of the journaled run, the indexes of those that are done, and whether the run finished
+
+        Returns: (steps, folders_to_delete, done, finished), or None if there is no journal
+        """
+        if not os.path.exists(self.path):
+            return None
+        done = dict()
+        finished = False
+        with open(self.path) as file:
+            try:
+                header = json.loads(file.readline())
+            except ValueError:
+                return None
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    break
+                if 'done' in entry:
+                    done[entry['done']] = True
+                finished = finished or entry.get('finished', False)
+        steps = [OrganizeStep(*step) for step in header['steps']]
+        return steps, header.get('folders_to_delete', list()), done, finished
+
+    def pending(self):
+        """ The plan of an interrupted run, with its completed steps, or None if the last run finished """
+        journal = self.read()
+        if journal is None or journal[3]:
+            return None
+        steps, folders_to_delete, done, finished = journal
+        plan = OrganizePlan(steps=steps, folders_to_delete=folders_to_delete, resumed=True, completed=set(done))
+        plan.folders = {os.path.dirname(step.destination) for step in steps if step.kind != 'skip'}
+        return plan
+
+    def undo(self):
+        """ Moves the files of the journaled run back to where they came from, newest first
+
+        Returns: The undone steps
+        """
+        journal = self.read()
+        if journal is None:
+            return list()
+        steps, folders_to_delete, done, finished = journal
+        undone = list()
+        for i in reversed(list(done)):
+            step = steps[i]
+            if not os.path.exists(step.destination) or os.path.exists(step.source):
+                continue
+            os.makedirs(os.path.dirname(step.source), exist_ok=True)
+            if step.kind == 'rename':
+                rename_no_replace(step.destination, step.source)
+            else:
+                move_file(step.destination, step.source)
+            undone.append(step)
+        os.remove(self.path)
+        return undone
+
+
+def execute_plan(plan, journal, library, scheduler, on_done=None, on_progress=None):
+    """ Runs the steps of a plan, journaling each step as it completes
+
+    Args:
+        plan (OrganizePlan): The plan to run
+        journal (OrganizeJournal): The journal of the run
+        library (LibraryIndex): The destination folders and files, updated as files are moved
+        scheduler (MoveScheduler): Runs the moves
+        on_done (function): Called with (step, error) after each step; error is None if the step succeeded
+        on_progress (function): Called with (step, bytes copied) while a file is copied to another device
+
+    Returns: The steps that failed
+    """
+    if plan.resumed:
+        journal.resume()
+    else:
+        journal.start(plan)
+    for folder in sorted(plan.folders):
+        library.makedirs(folder)
+    failed = list()
+    moves = list()
+    for i, step in enumerate(plan.steps):
+        if i in plan.completed:
+            continue
+        if plan.resumed and step.kind != 'skip' \
+                and not os.path.exists(step.source) and os.path.exists(step.destination):
+            # Done by the interrupted run, which stopped before journaling it
+            journal.record(i)
+            library.add(step.destination)
+            continue
+        if step.kind == 'move':
+            moves.append((step.source, step.destination, i))
+            # Reserve the new name while the file is moving
+            library.add(step.destination)
+            continue
+        error = None
+        if step.kind == 'rename':
+            try:
+                rename_no_replace(step.source, step.destination)
+                library.remove(step.source)
+                library.add(step.destination)
+                journal.record(i)
+            except OSError as e:
+                error = e
+                failed.append(step)
+        if on_done:
+            on_done(step, error)
+
+    def on_moved(source, destination, i, error):
+        if error is None:
+            journal.record(i)
+        else:
+            library.remove(destination)
+            failed.append(plan.steps[i])
+        if on_done:
+            on_done(plan.steps[i], error)
+
+    def on_copy_progress(source, destination, i, copied):
+        on_progress(plan.steps[i], copied)
+
+    # The scheduler also fails the moves whose journaling or callback raised, after on_moved
+    failed_steps = {id(step) for step in failed}
+    for source, destination, i, error in scheduler.run(moves, on_moved, on_copy_progress if on_progress else None):
+        if id(plan.steps[i]) not in failed_steps:
+            failed.append(plan.steps[i])
+    journal.finish()
+    return failed
+
+
+def delete_moved_folders(plan, failed):
+    """ Deletes the download folders whose media files were moved,
+        keeping those that hold a file that failed or was skipped, in them or in a folder under them
+
+    Args:
+        plan (OrganizePlan): The plan that was run
+        failed (list): The steps that failed, as returned by execute_plan
+
+    Returns: The deleted folders
+    """
+    kept = folders_of([step.source for step in failed] + [step.source for step in plan.steps if step.kind == 'skip'])
+    deleted = list()
+    for folder in plan.folders_to_delete:
+        if folder not in kept and os.path.exists(folder) and not has_partial_download(folder):
+            shutil.rmtree(folder)
+            deleted.append(folder)
+    return deleted
+
+
+def has_partial_download(folder):
+    """ Whether a download is still in progress in the folder, or a folder under it, from its partial markers """
+    for path, folder_names, file_names in os.walk(folder):
+        if any(name.lower().endswith(PARTIAL_SUFFIXES) for name in file_names):
+            return True
+    return False
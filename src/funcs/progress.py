@@ -0,0 +1,141 @@
+import time
+import threading
+from collections import deque
+
+
+def format_bytes(size):
+    """ A readable size; 1536 -> "1.5 KB" """
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if abs(size) < 1024 or unit == 'TB':
+            return f'{size:,.0f} {unit}' if unit == 'B' else f'{size:,.1f} {unit}'
+        size /= 1024
+
+
+def format_duration(seconds):
+    """ A readable duration; 3725 -> "1:02:05" """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}' if hours else f'{minutes}:{seconds:02}'
+
+
+class Progress:
+    """
+        Thread-safe progress of a scan or an organize run, weighed by bytes where they are known.
+
+        A copy of a 40 GB file to another disk counts for 40 GB of the run, rather than for a single file,
+        while a scan, whose sizes are not known up front, is measured in entries.
+        The rates are measured over the last <window> seconds, and the ETA follows from them.
+    """
+
+    def __init__(self, total_bytes=0, total_files=0, window=5.0):
+        """
+        Args:
+            total_bytes (int): The number of bytes to process; 0 if unknown, or not measured in bytes
+            total_files (int): The number of files to process; 0 if unknown
+            window (float): The number of seconds the rates are measured over
+        """
+        self.total_bytes = total_bytes
+        self.total_files = total_files
+        self.window = window
+        self.done_bytes = 0
+        self.done_files = 0
+        self.started = time.monotonic()
+        # {key: bytes} of the files being processed
+        self.__partial = dict()
+        # (time, bytes, files) samples within the window
+        self.__samples = deque([(self.started, 0, 0)])
+        self.__lock = threading.Lock()
+
+    def __sample(self):
+        now = time.monotonic()
+        self.__samples.append((now, self.__bytes(), self.done_files))
+        while len(self.__samples) > 2 and now - self.__samples[1][0] > self.window:
+            self.__samples.popleft()
+
+    def __bytes(self):
+        return self.done_bytes + sum(self.__partial.values())
+
+    def update(self, key, done_bytes):
+        """ Sets the number of bytes processed of a file that is still being processed """
+        with self.__lock:
+            self.__partial[key] = done_bytes
+            self.__sample()
+
+    def advance(self, files=1, done_bytes=0, key=None):
+        """ Adds finished files, and their bytes
+
+        Args:
+            files (int): The number of files, or scanned entries, finished
+            done_bytes (int): The number of bytes of the finished files
+            key: The key of the file's partial progress, given to update
+        """
+        with self.__lock:
+            self.__partial.pop(key, None)
+            self.done_files += files
+            self.done_bytes += done_bytes
+            self.__sample()
+
+    @property
+    def bytes_per_second(self):
+        with self.__lock:
+            (start, start_bytes, _), (end, end_bytes, _) = self.__samples[0], self.__samples[-1]
+        return (end_bytes - start_bytes) / (end - start) if end > start else 0.0
+
+    @property
+    def files_per_second(self):
+        with self.__lock:
+            (start, _, start_files), (end, _, end_files) = self.__samples[0], self.__samples[-1]
+        return (end_files - start_files) / (end - start) if end > start else 0.0
+
+    @property
+    def fraction(self):
+        """ The fraction of the work that is done, by bytes if their total is known; None if unknown """
+        with self.__lock:
+            if self.total_bytes:
+                return min(1.0, self.__bytes() / self.total_bytes)
+            if self.total_files:
+                return min(1.0, self.done_files / self.total_files)
+        return None
+
+    @property
+    def eta(self):
+        """ The estimated number of seconds left, or None if it is unknown """
+        if self.total_bytes:
+            with self.__lock:
+                left = self.total_bytes - self.__bytes()
+            rate = self.bytes_per_second
+        elif self.total_files:
+            left = self.total_files - self.done_files
+            rate = self.files_per_second
+        else:
+            return None
+        if left <= 0:
+            return 0.0
+        return left / rate if rate else None
+
+    def snapshot(self):
+        """ The progress numbers, for callers without a progress bar """
+        with self.__lock:
+            done_bytes = self.__bytes()
+        return {
+            'done_bytes': done_bytes,
+            'total_bytes': self.total_bytes,
+            'done_files': self.done_files,
+            'total_files': self.total_files,
+            'fraction': self.fraction,
+            'bytes_per_second': self.bytes_per_second,
+            'files_per_second': self.files_per_second,
+            'eta': self.eta,
+            'elapsed': time.monotonic() - self.started,
+        }
+
+    def label(self):
+        """ A line of the rates and the ETA; "12.5 MB/s  |  4.0 files/s  |  ETA 1:05" """
+        parts = list()
+        if self.total_bytes:
+            parts.append(f'{format_bytes(self.bytes_per_second)}/s')
+        parts.append(f'{self.files_per_second:,.1f} files/s')
+        eta = self.eta
+        if eta is not None:
+            parts.append(f'ETA {format_duration(eta)}')
+        return '  |  '.join(parts)
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import stat as st
+from dataclasses import asdict
+
+from src.funcs.general import PARSER_VERSION, iter_classified_chunks
+from src.components.data import MediaFile
+
+
+def get_extension(file_name: str) -> str:
+    """ The lowercased extension of a file name, matching MediaFile.extension """
+    return file_name.split('.')[-1].lower()
+
+
+def under_roots(roots):
+    """ A function of whether a path is one of the roots, or in one of them; "/dl2/file" is not in "/dl" """
+    roots = set(roots)
+    prefixes = tuple(os.path.join(r, '') for r in roots)
+    return lambda path: path in roots or path.startswith(prefixes)
+
+
+class ScanIndex:
+    """
+        On-disk index of the media files found by previous scans.
+
+        Each file is stored with its (size, mtime_ns, inode) signature and the parsed MediaFile fields,
+        so unchanged files can be restored without parsing them again.
+        Each folder is stored with its mtime, and the names of its media files and sub folders,
+        so unchanged folders can be walked without listing them again.
+        The files are stored with the PARSER_VERSION that parsed them, and are dropped when it changes.
+        Files that were not finished downloads are stored with only their signature, so a later scan that finds
+        them unchanged knows they have stopped changing.
+    """
+    FIELDS = ('type', 'title', 'season', 'episode', 'file_rename')
+
+    def __init__(self, path, extensions=()):
+        """
+        Args:
+            path (str): The path to the index file
+            extensions (set): The media extensions being scanned for; The folder listings are discarded if they change
+        """
+        self.path = path
+        self.extensions = sorted(extensions)
+        # {path: [size, mtime_ns, inode, *FIELDS]}
+        self.files = dict()
+        # {path: [mtime_ns, entries_count, [media file names], [sub folder names]]}
+        self.folders = dict()
+        # {path: [size, mtime_ns, inode]} of the files that were not ready to organize
+        self.pending = dict()
+        self.__seen = set()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            # A corrupt index is treated as a cold scan
+            return None
+        if index.get('parser') == PARSER_VERSION:
+            self.files = index.get('files', {})
+        if index.get('extensions') == self.extensions:
+            self.folders = index.get('folders', {})
+        self.pending = index.get('pending', {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        index = {
+            'parser': PARSER_VERSION, 'extensions': self.extensions, 'folders': self.folders, 'files': self.files,
+            'pending': self.pending,
+        }
+        with open(self.path, 'w') as file:
+            json.dump(index, file, separators=(',', ':'))
+
+    def prune(self, roots):
+        """ Drops any files and folders under the roots that were not seen by the last scan """
+        is_under = under_roots(roots)
+        for entries in (self.files, self.folders, self.pending):
+            for path in [p for p in entries if is_under(p) and p not in self.__seen]:
+                del entries[path]
+        self.__seen = set()
+
+    def count_entries(self, roots):
+        """ The number of entries under the roots, as of the last scan; Estimates the size of the next scan """
+        is_under = under_roots(roots)
+        return sum(folder[1] for path, folder in self.folders.items() if is_under(path))
+
+    def get_folder(self, path, mtime_ns):
+        """ The cached (entries_count, media file names, sub folder names) of a folder, if it has not changed """
+        self.__seen.add(path)
+        folder = self.folders.get(path)
+        if folder and folder[0] == mtime_ns:
+            return folder[1:]
+        return None
+
+    def set_folder(self, path, mtime_ns, entries_count, file_names, folder_names):
+        self.__seen.add(path)
+        self.folders[path] = [mtime_ns, entries_count, file_names, folder_names]
+
+    def get(self, path, stat):
+        """ The cached MediaFile fields of a file, if it has not changed
+
+        Args:
+            path (str): The path to the file
+            stat (os.stat_result): The current stat of the file
+
+        Returns: A dictionary of the MediaFile fields, or None
+        """
+        self.__seen.add(path)
+        file = self.files.get(path)
+        if not file or file[:2] != [stat.st_size, stat.st_mtime_ns]:
+            return None
+        # DirEntry.stat does not fill st_ino on Windows, so a missing inode is not a mismatch
+        if file[2] and stat.st_ino and file[2] != stat.st_ino:
+            return None
+        return dict(zip(self.FIELDS, file[3:]))
+
+    def is_pending_unchanged(self, path, stat):
+        """ Whether the last scan saw the file not ready, with the same size, mtime and inode """
+        self.__seen.add(path)
+        file = self.pending.get(path)
+        return bool(file) and file[:2] == [stat.st_size, stat.st_mtime_ns] \
+            and not (file[2] and stat.st_ino and file[2] != stat.st_ino)
+
+    def set_pending(self, path, stat):
+        """ Records the signature of a file that is not ready, for the next scan to compare """
+        self.__seen.add(path)
+        self.pending[path] = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+    def set(self, path, stat, fields):
+        """
+        Args:
+            path (str): The path to the file
+            stat (os.stat_result): The current stat of the file
+            fields (dict): The MediaFile fields to cache
+        """
+        self.__seen.add(path)
+        self.pending.pop(path, None)
+        self.files[path] = [stat.st_size, stat.st_mtime_ns, stat.st_ino] + [fields[f] for f in self.FIELDS]
+
+
+def iter_media_files(roots, extensions, on_progress=None, index=None, gate=None):
+    """ Walks each root once with os.scandir, yielding the media files found along the way.
+
+        Folders are visited depth first, and entries are sorted by name, so the output order is stable
+        between runs. Non-media files are filtered by extension before anything else is done with them,
+        and the file/folder checks reuse the type information cached on each DirEntry.
+        If an index is given, folders that have not changed since the last scan are not listed again;
+        their media files are only stat'd.
+
+    Args:
+        roots (list): The folders to scan
+        extensions (set): The lowercased media extensions to keep
+        on_progress (Callable): Called as on_progress(entries_scanned, media_found, path) for each media file
+        index (ScanIndex): The index of previous scans
+        gate (CompletenessGate): Leaves out the media files with a partial download marker beside them
+
+    Returns: A generator of (root, path, os.stat_result) for each media file
+    """
+    scanned = 0
+    found = 0
+    for root in roots:
+        folders = [root]
+        while folders:
+            folder = folders.pop()
+            try:
+                mtime_ns = os.stat(folder).st_mtime_ns if index else None
+                cached = index.get_folder(folder, mtime_ns) if index else None
+                if cached:
+                    entries_count, file_names, folder_names = cached
+                    files = [(os.path.join(folder, name), None) for name in file_names]
+                    sub_folders = [os.path.join(folder, name) for name in folder_names]
+                else:
+                    with os.scandir(folder) as it:
+                        entries = sorted(it, key=lambda e: e.name)
+                    files, sub_folders = _split_entries(entries, extensions, gate)
+                    entries_count = len(entries) - len(sub_folders)
+                    if index:
+                        index.set_folder(folder, mtime_ns, entries_count,
+                                         [entry.name for path, entry in files],
+                                         [os.path.basename(f) for f in sub_folders])
+            except OSError:
+                # Unreadable or missing folders are skipped, the same as os.walk
+                continue
+            scanned += entries_count
+            for path, entry in files:
+                try:
+                    # DirEntry.stat is cached, and free on Windows where scandir returns it
+                    stat = entry.stat() if entry else os.stat(path)
+                except OSError:
+                    continue
+                if not st.S_ISREG(stat.st_mode):
+                    continue
+                found += 1
+                if on_progress:
+                    on_progress(scanned, found, path)
+                yield root, path, stat
+            # Reversed, so that the folders are popped in sorted order
+            folders.extend(reversed(sub_folders))
+
+
+def _split_entries(entries, extensions, gate=None):
+    """ Splits the DirEntries of a folder into (path, DirEntry) of its media files, and the paths of its sub folders """
+    files = []
+    sub_folders = []
+    # A marker is added or removed with a folder entry, which changes the folder's mtime; So a file left out here is
+    # listed again once its download is done, and the cached listing of an unchanged folder never needs checking
+    names = {entry.name.lower() for entry in entries} if gate else None
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                sub_folders.append(entry.path)
+            elif get_extension(entry.name) in extensions and entry.is_file():
+                if gate and gate.has_marker(entry.path, names):
+                    continue
+                files.append((entry.path, entry))
+        except OSError:
+            continue
+    return files, sub_folders
+
+
+def scan_media(paths, extensions, media_containers, index, workers=0, chunk_size=1000, on_progress=None, on_files=None,
+               stopped=None, interval=0.25, gate=None):
+    """ Scans the paths for media files, and groups them into the media containers as they are found.
+
+        File names are parsed in chunks, by the scan workers, while the walk goes on. Chunks are also cut by time,
+        so the first files are grouped quickly on a slow share. Unchanged files are restored from the index.
+        If a gate is given, files that are still downloading are left out before they are parsed, and only their
+        signature is indexed, so the next scan looks at them again, and takes them if they have not changed since.
+
+    Args:
+        paths (list): The folders to scan
+        extensions (set): The lowercased media extensions to keep
+        media_containers (MediaContainers): The containers to group the media files into
+        index (ScanIndex): The index of previous scans; It is pruned, but not saved
+        workers (int): The number of processes that parse file names; 0 parses them on this thread
+        chunk_size (int): The maximum number of files per chunk
+        on_progress (Callable): Called as on_progress(entries_scanned, media_found, path) for each media file
+        on_files (Callable): Called with the (container, media file) pairs grouped since its last call,
+                             every <interval> seconds and once the scan is done
+        stopped (threading.Event): Stops the scan when set
+        interval (float): The number of seconds between chunks, and between calls of on_files
+        gate (CompletenessGate): Decides which files are finished downloads; The rest are in its not_ready list
+
+    Returns: True if the scan finished, or False if it was stopped
+    """
+    def iter_chunks():
+        """ Chunks the scanned files, with the paths of those that need to be parsed """
+        chunk = list()
+        chunk_started = time.monotonic()
+        for scanned_file in iter_media_files(paths, extensions, on_progress, index, gate):
+            chunk.append(scanned_file)
+            if len(chunk) >= chunk_size or time.monotonic() - chunk_started > interval:
+                yield prepare_chunk(chunk)
+                chunk = list()
+                chunk_started = time.monotonic()
+        yield prepare_chunk(chunk)
+
+    def prepare_chunk(chunk):
+        cached = [index.get(file_path, stat) for folder_path, file_path, stat in chunk]
+        if gate is not None:
+            # Only new or changed files are checked against the clock, or opened; Files the last scan saw are settled
+            ready = [gate.is_settled(file_path, stat, fields is not None, index.is_pending_unchanged(file_path, stat))
+                     for (folder_path, file_path, stat), fields in zip(chunk, cached)]
+            for (folder_path, file_path, stat), is_ready in zip(chunk, ready):
+                if not is_ready:
+                    index.set_pending(file_path, stat)
+            chunk = [scanned_file for scanned_file, is_ready in zip(chunk, ready) if is_ready]
+            cached = [fields for fields, is_ready in zip(cached, ready) if is_ready]
+        to_parse = [file_path for (folder_path, file_path, stat), fields in zip(chunk, cached) if not fields]
+        return (chunk, cached), to_parse
+
+    # (container, media file) of the files not yet passed to on_files
+    grouped = list()
+    sent = time.monotonic()
+    for (chunk, cached), rows in iter_classified_chunks(iter_chunks(), workers):
+        rows = iter(rows)
+        for (folder_path, file_path, stat), fields in zip(chunk, cached):
+            # Restore the parsed fields of unchanged files from the index, instead of parsing them again
+            if fields:
+                media_file = MediaFile(file_path, folder_path, **fields)
+            else:
+                media_file = MediaFile(file_path, folder_path, parsed=next(rows))
+                index.set(file_path, stat, asdict(media_file))
+            grouped.append((media_containers.add(media_file), media_file))
+        if on_files and grouped and time.monotonic() - sent > interval:
+            on_files(grouped)
+            grouped = list()
+            sent = time.monotonic()
+        if stopped is not None and stopped.is_set():
+            return False
+    if on_files and grouped:
+        on_files(grouped)
+    index.prune(paths)
+    return True
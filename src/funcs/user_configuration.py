@@ -1,5 +1,4 @@
-import tkinter.filedialog as filedialog
-import yaml
+from src.components.data import load_yaml
 
 
 def save_paths(settings_path):
@@ -10,9 +9,10 @@ def save_paths(settings_path):
 
     Returns: The updated users settings
     """
-    with open(settings_path) as c:
-        settings = yaml.safe_load(c)
+    import yaml
+    import tkinter.filedialog as filedialog
 
+    settings = load_yaml(settings_path)
     for folder in settings['paths']:
         path = filedialog.askdirectory(title=f'Choose the path to your {folder.title()} folder.')
         if path:
@@ -35,8 +35,7 @@ def get_user_set_path(settings_path, path='downloads'):
 
     Returns: The path
     """
-    with open(settings_path) as c:
-        settings = yaml.safe_load(c)
+    settings = load_yaml(settings_path)
 
     if not settings['paths'].get(path):
         # If the locations are not saved, ask for the locations and save them to a settings file
@@ -0,0 +1,207 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from src.funcs.scanner import get_extension
+
+# The inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+# A file was written and closed, or moved in, or a folder was created or moved in
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+# struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    """ A minimal binding of Linux's inotify, through ctypes """
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.__add_watch = libc.inotify_add_watch
+        self.__add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        """ Watches a folder
+
+        Returns: The watch descriptor, which the folder's events are read with
+        """
+        wd = self.__add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        return wd
+
+    def read(self, timeout=None):
+        """ The events that happened since the last read, waiting up to timeout seconds for the first of them
+
+        Returns: A list of (watch descriptor, mask, name)
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = list()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+        Watches folder trees for new media files, and hands them over in debounced batches.
+
+        Each folder of the trees is watched with inotify, so a new file is known from its event,
+        without scanning the trees again. Only a folder that is created or moved into a tree is listed,
+        to watch it and to find the files that were already in it.
+        A batch is handed over once no event has happened for <debounce> seconds, so a season pack that
+        arrives as a burst of files is organized at once, or after <max_wait> seconds of constant events.
+    """
+
+    def __init__(self, roots, extensions, debounce=5.0, max_wait=60.0):
+        """
+        Args:
+            roots (list): The folders to watch, with the folders under them
+            extensions (set): The lowercased media extensions to hand over
+            debounce (float): The number of quiet seconds that end a batch
+            max_wait (float): The maximum number of seconds a file waits in a batch
+        """
+        self.roots = list(roots)
+        self.extensions = extensions
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.inotify = Inotify()
+        # {watch descriptor: (root, folder)}
+        self.__watches = dict()
+        # {path: (root, monotonic time)} of the files to hand over again, at that time
+        self.__deferred = dict()
+        for root in self.roots:
+            self.__watch_tree(root, root)
+
+    def __watch_tree(self, root, folder):
+        """ Watches a folder and the folders under it
+
+        Returns: The paths of the media files already in them
+        """
+        found = list()
+        folders = [folder]
+        while folders:
+            folder = folders.pop()
+            try:
+                # Watched before it is listed, so a file that arrives in between is not missed
+                self.__watches[self.inotify.add_watch(folder)] = (root, folder)
+                with os.scandir(folder) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    elif get_extension(entry.name) in self.extensions:
+                        found.append(entry.path)
+                except OSError:
+                    continue
+        return found
+
+    def defer(self, files, delay):
+        """ Hands files over again in a later batch, such as downloads that were not finished when handed over;
+            A file written again in the meantime is handed over after its new event, as usual
+
+        Args:
+            files (list): (root, path) of the files
+            delay (float): The number of seconds to wait
+        """
+        due = time.monotonic() + delay
+        for root, path in files:
+            self.__deferred[path] = (root, due)
+
+    def batches(self, stopped=None):
+        """ Yields the new media files, in batches
+
+        Args:
+            stopped (threading.Event): Stops watching when set
+
+        Returns: A generator of lists of (root, path), in the order the files arrived
+        """
+        # {path: root} of the files in the next batch
+        pending = dict()
+        quiet_at = started_at = None
+        while stopped is None or not stopped.is_set():
+            timeout = None
+            if pending:
+                timeout = max(0.0, min(quiet_at, started_at + self.max_wait) - time.monotonic())
+            if self.__deferred:
+                due = max(0.0, min(due for root, due in self.__deferred.values()) - time.monotonic())
+                timeout = due if timeout is None else min(timeout, due)
+            if stopped is not None:
+                # Wake up now and then, to see if the watch was stopped
+                timeout = 1.0 if timeout is None else min(timeout, 1.0)
+            events = self.inotify.read(timeout)
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped, so the trees are listed again to find what they were about
+                    for root in self.roots:
+                        pending.update(dict.fromkeys(self.__watch_tree(root, root), root))
+                elif mask & IN_IGNORED:
+                    # The folder was deleted, or moved away
+                    self.__watches.pop(wd, None)
+                    continue
+                watch = self.__watches.get(wd)
+                if watch is None:
+                    continue
+                root, folder = watch
+                path = os.path.join(folder, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        pending.update(dict.fromkeys(self.__watch_tree(root, path), root))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and get_extension(name) in self.extensions:
+                    pending[path] = root
+                    self.__deferred.pop(path, None)
+            now = time.monotonic()
+            for path, (root, due) in list(self.__deferred.items()):
+                if due <= now:
+                    del self.__deferred[path]
+                    if path not in pending:
+                        pending[path] = root
+                        # A deferred file does not wait for the debounce again, but may join a batch under way
+                        quiet_at = quiet_at or now
+                        started_at = started_at or now
+            if events:
+                # Any event pushes the batch back, as more files of the same download may be on their way
+                quiet_at = now + self.debounce
+                if started_at is None and pending:
+                    started_at = now
+            if pending and (now >= quiet_at or now >= started_at + self.max_wait):
+                yield list((root, path) for path, root in pending.items())
+                pending = dict()
+                quiet_at = started_at = None
+
+    def close(self):
+        self.inotify.close()
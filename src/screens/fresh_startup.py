@@ -1,6 +1,5 @@
 import math
 import os
-import yaml
 from tkinter import *
 
 from src.components.ui import Buttons
@@ -42,10 +41,12 @@ class FreshStartup(Frame):
         """
         os.makedirs(os.path.dirname(CONFIG.settings_path), exist_ok=True)
         if not os.path.exists(CONFIG.settings_path):
+            import yaml
             with open(CONFIG.settings_path, 'w') as c:
                 user_settings = {
                     'media_extensions': CONFIG.media_extensions,
-                    'paths': CONFIG.paths.to_dict()
+                    'paths': CONFIG.paths.to_dict(),
+                    **{name: getattr(CONFIG, name) for name in CONFIG.CONFIG_FIELDS}
                 }
                 yaml.dump(user_settings, c, indent=2)
 
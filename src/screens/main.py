@@ -1,19 +1,32 @@
 import threading
-import shutil
 import os
 import json
-from pathlib import Path
 from tkinter import *
 from tkinter.ttk import Progressbar, Style
 
-from src.components.ui import ButtonGroup, CheckBoxes
+from src.components.ui import ButtonGroup
+from src.components.tree import VirtualTree
+from src.components.updates import UpdateChannel
 from src.funcs.user_configuration import save_paths
-from src.components.data import CONFIG, Images, MediaFile, MediaContainer
+from src.funcs.scanner import ScanIndex, scan_media
+from src.funcs.completeness import CompletenessGate
+from src.funcs.general import PARSER_VERSION
+from src.funcs.memo import PARSE_CACHE
+from src.funcs.aliases import AliasTable
+from src.funcs.library import LibraryIndex
+from src.funcs.mover import MoveScheduler
+from src.funcs.organizer import OrganizeJournal, plan_organize, execute_plan, delete_moved_folders
+from src.funcs.progress import Progress, format_bytes
+from src.components.data import CONFIG, MediaContainers
+from src.components.images import Images
 
 from pprint import pprint
 
 
 class Main(Frame):
+    # The range of the progress bar, which is set from the fraction of the work that is done
+    progress_maximum = 1000
+
     def __init__(self, app, bg=CONFIG.colors.main, *args, **kwargs):
         """
         Args:
@@ -28,8 +41,22 @@ class Main(Frame):
 
         ''' Filter media will contain a dictionary like:
                         {path: {file_name: name, title: title, kind: kind, ...}}'''
-        self.media_containers: list[MediaContainer] = list()
+        # Known titles, and the show or movie name they were organized under
+        self.aliases = AliasTable(CONFIG.aliases_path)
+        self.media_containers = MediaContainers(aliases=self.aliases)
+        # The paths of the downloads the scans found not finished, whose folders are not deleted
+        self.not_ready = set()
+        # The destination folders in the media folder, listed while the user reviews their media
+        self.library = None
+        # The progress of the current scan or organize run
+        self.progress = Progress()
         self.disable_buttons = False
+        # Worker threads update the widgets through this channel, rather than touching Tk directly
+        self.updates = UpdateChannel(self)
+        # Set when the screen is closed, to stop a running scan
+        self.__stopped = threading.Event()
+        self.tree = None
+        self.reviewed = dict()
 
         # Frames
         self.left_frame = Frame(self, bg=CONFIG.colors.main, bd=2, relief=RAISED)
@@ -61,10 +88,10 @@ class Main(Frame):
         # Set initial progress bar text
         self.s.configure(self.style, text='\n\n', troughcolor=CONFIG.colors.sub,
                          background=CONFIG.colors.special, foreground=CONFIG.colors.font,
-                         font=CONFIG.fonts.xsmall, thickness=45)
+                         font=CONFIG.fonts.xsmall, thickness=60)
 
         w = self.winfo_width()
-        self.progress_bar = Progressbar(self.status_bar, style=self.style, length=w - 8)
+        self.progress_bar = Progressbar(self.status_bar, style=self.style, length=w - 8, maximum=self.progress_maximum)
         self.progress_bar.bind('<Configure>', self.on_progress_bar_adjust)
         # self.progress_bar.pack(side=BOTTOM)
         # self.status_bar.pack_forget()
@@ -81,6 +108,8 @@ class Main(Frame):
 
     def __on_destroy(self, event):
         """ Caches some information when the App is closed """
+        self.updates.close()
+        self.__stopped.set()
         cache = dict()
         cache['geometry'] = {
             'w': self.master.winfo_width(),
@@ -101,42 +130,53 @@ class Main(Frame):
         Returns: A dictionary of information about each file
         """
         self.progress_bar_appear()
-        self.progress_bar['maximum'] = len([
-            file_name
-            for path in paths
-            for x, y, files in os.walk(path)
-            for file_name in files
-            if file_name.split('.')[-1] in CONFIG.media_extensions
-        ])
-        self.progress_bar['value'] = 0
-        self.s.configure(style=self.style, text='Getting media info...')
+        self.set_status('Getting media info...')
         # Get a list of files to gather info for, and extract info from the local file
-        for folder_path in paths:
-            for path, folders, files in sorted(os.walk(folder_path)):
-                for file in sorted(files):
-                    current_file_path = os.path.join(path, file)
-                    # Skip non-files
-                    if not os.path.isfile(current_file_path):
-                        continue
-                    media_file = MediaFile(current_file_path, folder_path)
-                    # Skip non-media files
-                    if media_file.extension not in CONFIG.media_extensions:
-                        continue
-                    added = False
-                    for c in self.media_containers:
-                        if added:
-                            continue
-                        added = c.add_similar_media_file(media_file)
-                    if not added:
-                        mc = MediaContainer()
-                        mc.add_similar_media_file(media_file)
-                        self.media_containers.append(mc)
-                    self.progress_bar['value'] += 1
-                    self.s.configure(
-                        style=self.style,
-                        text=f'Got info for {file}\nIn the {folder_path} directory\n'
-                    )
-        self.progress_complete('Gathered Media!')
+        index = ScanIndex(CONFIG.index_path, CONFIG.media_extensions)
+        # A scan is measured in entries; Their number is estimated from the last scan, if there was one
+        self.progress = Progress(total_files=index.count_entries(paths))
+        if not self.progress.total_files:
+            # The number of entries is unknown until the single pass is done, so the bar only shows activity
+            self.updates.call(self.progress_bar.config, mode='indeterminate')
+
+        def on_progress(scanned, found, path):
+            self.progress.advance(scanned - self.progress.done_files)
+            if self.progress.total_files:
+                self.set_progress(self.progress.fraction)
+            else:
+                self.updates.post('progress', self.progress_bar.step)
+            self.set_status(
+                f'Got info for {os.path.basename(path)}\n'
+                f'Found {found} media files in {scanned} files scanned\n'
+                f'{self.progress.label()}'
+            )
+
+        self.aliases.learn_library(CONFIG.paths.media)
+        if CONFIG.persist_parse_cache:
+            PARSE_CACHE.load(CONFIG.parse_cache_path, PARSER_VERSION)
+
+        def on_files(grouped):
+            # The titles are read now, as they may change when files are added to the containers later
+            files = [(container.title, media_file) for container, media_file in grouped]
+            self.updates.call(self.add_to_filter_window, files)
+
+        # Downloads that are still in progress are left out, until a later scan finds them finished
+        gate = CompletenessGate(CONFIG.download_settle_seconds, CONFIG.check_open_files)
+        # Stream the grouped files into the filter window a few times a second
+        finished = scan_media(paths, CONFIG.media_extensions, self.media_containers, index, CONFIG.scan_workers,
+                              CONFIG.scan_chunk_size, on_progress, on_files, self.__stopped, gate=gate)
+        if not finished:
+            return None
+        index.save()
+        if CONFIG.persist_parse_cache:
+            PARSE_CACHE.save(CONFIG.parse_cache_path, PARSER_VERSION)
+        # Replaced by each scan, so a file that was not ready before, and has been found since, no longer keeps its folder
+        self.not_ready = set(gate.not_ready)
+        self.updates.call(self.progress_bar.config, mode='determinate')
+        if gate.not_ready:
+            self.progress_complete(f'Gathered Media!\n{len(gate.not_ready)} files still downloading were left out')
+        else:
+            self.progress_complete('Gathered Media!')
 
     def media_files_info(self, folder_paths):
         """ Gets information about each media file in a path, from IMDb.
@@ -161,129 +201,134 @@ class Main(Frame):
         if not folder_paths:
             return None
 
+        # Scan in the background, while the grouped files stream into the filter window
+        self.filter_window()
+        threading.Thread(target=self.__scan, args=(folder_paths,), daemon=True).start()
+
+    def __scan(self, folder_paths):
         self.get_media_info_from_paths(folder_paths)
+        if not self.__stopped.is_set():
+            self.updates.call(self.on_scan_complete)
 
+    def on_scan_complete(self):
+        """ Shows the grouped media, or that there is none, once the scan has finished """
         if not self.media_containers:
             self.progress_bar_appear()
             self.progress_complete('\nNo Media Detected...\n')
             self.buttons.organize.pack_forget()
         else:
-            self.filter_window()
+            self.library = LibraryIndex(CONFIG.paths.media)
+            self.library.build_in_background({c.title for c in self.media_containers if c.type == 'TV Show'})
+            # Files streamed in before their container's title changed are regrouped under the final titles
+            files = [(c.title, file) for c in self.media_containers for file in c.media_files]
+            if any(self.reviewed.get(file.path) != title for title, file in files):
+                # Keep what the user selected while the scan was running
+                selected = self.tree.model.selected_paths()
+                self.tree.destroy()
+                self.filter_window()
+                self.add_to_filter_window(files, selected)
             self.buttons.organize.pack(side=TOP, padx=10, pady=10, fill=X)
 
     def filter_window(self):
         """ The filter window that appears to filter the media files to be sorted. """
+        self.tree = VirtualTree(self.canvas_frame, dict())
+        self.tree.pack(side=LEFT, anchor=NW, fill=BOTH, expand=True)
+        # {file path: container title} of the files in the filter window
+        self.reviewed = dict()
+
+    def add_to_filter_window(self, files, selected=None):
+        """ Adds media files to the filter window, as the scan groups them.
+            The files are grouped and sorted by the tree's MediaTree, once per batch.
 
-        def create_files_dict():
-            """ Creates the media files dict, in a format that can be used to generate CheckBoxes.
-                Here we also pass our on_toggle_off and on_toggle_on functions,
-                as well as any additional metadata we need the CheckBox to have.
-
-            Args:
-                files (dict): The dict of all media files to be reformed
-
-            Returns: The reformed files dict
-            """
-            new_files = dict()
-            for container in self.media_containers:
-                title = container.title
-                kind = f'{container.type}s'
-                for file in container.media_files:
-                    # Reduce the display of the folder path to the last two folders, maximum
-                    folder_path = Path(file.origin_dir).parts
-                    if len(folder_path) > 1:
-                        folder = os.path.join(*folder_path[-2:])
-                    else:
-                        folder = os.path.join(*folder_path)
-                    metadata = dict()
-                    metadata['origin_dir'] = file.origin_dir
-                    metadata['file_path'] = file.path
-                    metadata['file_rename'] = file.file_rename
-                    metadata['on_toggle_off'] = file.deselect
-                    metadata['on_toggle_on'] = file.select
-                    new_files.setdefault(folder, {})
-                    if kind == 'TV Shows':
-                        season = f'Season {file.season}'
-                        new_files[folder].setdefault(kind, {})
-                        new_files[folder][kind].setdefault(title, {})
-                        new_files[folder][kind][title].setdefault(season, [])
-                        new_files[folder][kind][title][season].append(metadata)
-                        # Sort the files by the new name
-                        new_files[folder][kind][title][season] = list(sorted(
-                            new_files[folder][kind][title][season], key=lambda f: f['file_rename']))
-                    else:
-                        new_files[folder].setdefault(kind, [])
-                        new_files[folder][kind].append(metadata)
-                        # Sort the files by the new name
-                        new_files[folder][kind] = list(sorted(
-                            new_files[folder][kind], key=lambda f: f['file_rename']))
-
-            return new_files
-
-        checkboxes = CheckBoxes(self.canvas_frame, create_files_dict())
-        checkboxes.pack(side=LEFT, anchor=NW, fill=BOTH, expand=True)
+        Args:
+            files (list): (container title, media file) pairs
+            selected (set): The paths of the files that start selected; None to use MediaFile.selected
+        """
+        for title, file in files:
+            self.reviewed[file.path] = title
+        self.tree.add_files(files, selected)
 
     def recursively_organize_shows_and_movies(self, delete_folders=True):
         dl_path = CONFIG.paths.downloads
         media_path = CONFIG.paths.media
-        folders_to_delete = []
         self.progress_bar_appear()
-        self.progress_bar['maximum'] = len([
-            m.path for c in self.media_containers
-            for m in c.media_files if m.selected
-        ])
-        self.progress_bar['value'] = 0
-
+        library = self.library or LibraryIndex(media_path)
+        if self.library is None:
+            library.build({c.title for c in self.media_containers if c.type == 'TV Show'})
+        library.wait()
+        journal = OrganizeJournal(CONFIG.journal_path)
+        scheduler = MoveScheduler(CONFIG.move_streams_per_device, CONFIG.copy_verify, CONFIG.copy_chunk_size)
+        # {source: size} of the files to move
+        sizes = dict()
+
+        def on_done(step, error):
+            # Update status and increment progress bar to show that the file has moved
+            file_name = os.path.basename(step.source)
+            kind = step.media_file.type.title() if step.media_file else 'File'
+            output_folder = os.path.dirname(step.destination)
+            if error is not None:
+                status_message = f'Failed to organize: {file_name}\n{error}'
+            elif step.kind == 'move':
+                status_message = f'Moved & Renamed {kind}:\n' \
+                                 f'From: {file_name}\n' \
+                                 f'To: {os.path.basename(step.destination)}'
+            elif step.kind == 'rename':
+                status_message = f'File exists in {output_folder}, Renamed {kind}:\n' \
+                                 f'From: {file_name}\n' \
+                                 f'To: {os.path.basename(step.destination)}'
+            else:
+                status_message = f'Skipping: {file_name}\n' \
+                                 f'File exists in {output_folder}:\n' \
+                                 f'{step.destination}'
+            self.progress.advance(1, sizes.get(step.source, 0) if step.kind == 'move' else 0, step.source)
+            self.set_progress(self.progress.fraction)
+            self.set_status(f'{status_message}\n{self.progress.label()}')
+
+        def on_copy_progress(step, copied):
+            self.progress.update(step.source, copied)
+            self.set_progress(self.progress.fraction)
+            self.set_status(
+                f'Copying:\n'
+                f'{os.path.basename(step.destination)}\n'
+                f'{format_bytes(copied)} of {format_bytes(sizes.get(step.source, 0))}\n'
+                f'{self.progress.label()}'
+            )
+
+        def run(plan):
+            # Copies to another disk are weighed by their size, so a large file moves the bar further than a small one;
+            # Renames on the same disk take no time for their size, and only count as files
+            sizes.clear()
+            for i, step in enumerate(plan.steps):
+                if step.kind == 'move' and i not in plan.completed \
+                        and not scheduler.is_same_device(step.source, step.destination):
+                    try:
+                        sizes[step.source] = os.path.getsize(step.source)
+                    except OSError:
+                        pass
+            self.progress = Progress(sum(sizes.values()), len(plan) - len(plan.completed))
+            self.set_progress(0)
+            failed = execute_plan(plan, journal, library, scheduler, on_done, on_copy_progress)
+            # Delete folders that contained media files that were moved
+            if delete_folders:
+                delete_moved_folders(plan, failed)
+
+        # The selection is read from the filter window's model
+        selected = self.tree.model.selected_paths()
+        # Finish the run that was interrupted, from where it stopped, before starting a new one
+        interrupted = journal.pending()
+        if interrupted:
+            self.set_status('\nResuming the last organize run...\n')
+            run(interrupted)
+            # Leave out the files that were organized by the interrupted run
+            selected -= {step.source for step in interrupted.steps}
+
+        plan = plan_organize(self.media_containers, media_path, dl_path, library, selected, self.not_ready)
         for container in self.media_containers:
             for media_file in container.media_files:
-                if not media_file.selected:
-                    continue
-                # continue
-                path = os.path.dirname(media_file.path)
-                skip = False
-                # Route for TV Shows
-                if media_file.type == 'TV Show':
-                    season_folder = f'Season {media_file.season}'
-                    output_folder = os.path.join(media_path, 'TV Shows', container.title, season_folder)
-                # Route for Movies
-                else:
-                    output_folder = os.path.join(media_path, 'Movies')
-                output_path = os.path.join(output_folder, media_file.file_name)
-                renamed_file_path = os.path.join(output_folder, media_file.file_rename)
-                # Create output folder if it does not exist
-                os.makedirs(output_folder, exist_ok=True)
-                # Move and then rename file
-                if not os.path.exists(output_path) and not os.path.exists(renamed_file_path):
-                    shutil.move(media_file.path, output_path)
-                    os.rename(output_path, renamed_file_path)
-                    status_message = f'Moved & Renamed {media_file.type.title()}:\n' \
-                                     f'From: {media_file.file_name}\n' \
-                                     f'To: {media_file.file_rename}'
-                    # Update status and increment progress bar to show that the file has moved
-    
-                elif not os.path.exists(renamed_file_path):
-                    os.rename(output_path, renamed_file_path)
-                    # Update status and increment progress bar to show that the file has moved
-                    status_message = f'File exists in {output_folder}, Renamed {media_file.type.title()}:\n' \
-                                     f'From: {media_file.file_name}\n' \
-                                     f'To: {media_file.file_rename}'
-                else:
-                    skip = True
-                    status_message = f'Skipping: {media_file.file_name}\n' \
-                                     f'File exists in {output_folder}:\n' \
-                                     f'{renamed_file_path}'
-                self.progress_bar['value'] += 1
-                self.s.configure(style=self.style, text=status_message)
-                # Add the moved file's folder path to the list of folders to delete
-                if path != dl_path and path != media_path and path != os.path.dirname(output_path) \
-                        and path not in folders_to_delete and not skip:
-                    folders_to_delete.append(path)
-
-        # Delete folders that contained media files that were moved
-        if delete_folders:
-            for folder in folders_to_delete:
-                if os.path.exists(folder):
-                    shutil.rmtree(folder)
+                if media_file.path in selected:
+                    self.aliases.learn(media_file.title, container.title, media_file.type)
+        run(plan)
+        self.aliases.save()
         self.progress_complete('\nMedia Organized!\n')
         return None
 
@@ -292,18 +337,29 @@ class Main(Frame):
         tl = threading.Thread(target=self.recursively_organize_shows_and_movies)
         tl.start()
 
+    def set_status(self, text):
+        """ Sets the progress bar's label; Safe to call from any thread """
+        self.updates.post('status', self.s.configure, self.style, text=text)
+
+    def set_progress(self, fraction):
+        """ Sets the progress bar to the fraction of the work that is done; Safe to call from any thread """
+        self.updates.post('progress', self.progress_bar.config, value=(fraction or 0) * self.progress_maximum)
+
     def progress_bar_appear(self):
+        self.updates.call(self.__progress_bar_appear)
+        self.set_progress(0)
+        self.set_status('\n\n')
+
+    def __progress_bar_appear(self):
         self.toggle_buttons_enabled()
         self.progress_bar.pack(side=BOTTOM)
         w = self.winfo_width()
         self.progress_bar.config(length=w-8)
-        self.progress_bar['value'] = 0
-        self.s.configure(style=self.style, text='\n\n')
 
     def progress_complete(self, message):
-        self.toggle_buttons_enabled()
-        self.progress_bar['value'] = 0
-        self.s.configure(style=self.style, text=message)
+        self.updates.call(self.toggle_buttons_enabled)
+        self.set_progress(0)
+        self.set_status(message)
 
     def toggle_buttons_enabled(self):
         if self.disable_buttons: